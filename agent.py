@@ -1,15 +1,22 @@
 # agent.py
 
 import asyncio
-import yaml
+import threading
+import time
 from core.loop import AgentLoop
 from core.session import MultiMCP
-from core.context import MemoryItem, AgentContext
+from core.context import MemoryItem, AgentContext, load_profile_config
 import datetime
+import operator
 from pathlib import Path
-import json
+from typing import Any, List
+try:
+    import orjson as _json  # faster parsing of memory-server payloads when available
+except ImportError:
+    import json as _json
 import warnings
 from heuristic_rules import apply_input_heuristics
+from modules.response_cache import ExactResponseCache, SemanticResponseCache
 
 # Quiet noisy SWIG-related DeprecationWarnings emitted by third-party deps.
 warnings.filterwarnings(
@@ -21,30 +28,81 @@ warnings.filterwarnings(
 
 def log(stage: str, msg: str):
     """Simple timestamped console logger."""
-    now = datetime.datetime.now().strftime("%H:%M:%S")
+    now = time.strftime("%H:%M:%S")  # formats localtime() directly, no datetime object
     print(f"[{now}] [{stage}] {msg}")
 
 
+# Fields of a memory match used when formatting injected history.
+_EXCHANGE_FIELDS = operator.itemgetter("timestamp", "user_query", "final_answer")
+
+
+def _extract_matches(raw: Any) -> List[dict]:
+    """
+    Return the match list from a search_historical_conversations tool result.
+    Accepts content items as objects (.text) or dicts (["text"]), and payloads
+    that are either the {"result": {"matches": [...]}} envelope or a bare list.
+    """
+    first = raw.content[0]
+    text = first["text"] if isinstance(first, dict) else first.text
+    payload = _json.loads(text)
+    if isinstance(payload, list):
+        return payload
+    return payload.get("result", {}).get("matches", [])
+
+
+async def read_input(prompt: str) -> str:
+    """
+    input() without blocking the event loop. A daemon thread is used instead of
+    asyncio.to_thread so a pending read never holds up interpreter shutdown.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def _resolve(setter, value):
+        if not future.done():
+            setter(value)
+
+    def _reader():
+        try:
+            line = input(prompt)
+        except BaseException as e:
+            outcome = (future.set_exception, e)
+        else:
+            outcome = (future.set_result, line)
+        try:
+            loop.call_soon_threadsafe(_resolve, *outcome)
+        except RuntimeError:
+            pass  # loop already closed
+
+    threading.Thread(target=_reader, daemon=True).start()
+    return await future
+
+
 async def main():
     print("🧠 Cortex-R Agent Ready")
     current_session = None
 
-    with open("config/profiles.yaml", "r") as f:
-        profile = yaml.safe_load(f)
-        mcp_servers_list = profile.get("mcp_servers", [])
-        mcp_servers = {server["id"]: server for server in mcp_servers_list}
+    profile = load_profile_config()
+    mcp_servers_list = profile.get("mcp_servers", [])
+    mcp_servers = {server["id"]: server for server in mcp_servers_list}
 
     multi_mcp = MultiMCP(server_configs=list(mcp_servers.values()))
     await multi_mcp.initialize()
 
+    # Repeated and near-duplicate queries are answered from here without running the agent loop.
+    exact_cache = ExactResponseCache()
+    response_cache = SemanticResponseCache(threshold=0.98)
+    # Load the embedding model in the background so the first query doesn't pay for it.
+    prewarm_task = asyncio.create_task(response_cache.prewarm())
+
     # --- This is the new "best of both worlds" injection logic ---
-    async def get_selectively_injected_context(user_query: str, dispatcher: MultiMCP) -> str:
+    async def get_relevant_history(user_query: str, dispatcher: MultiMCP) -> str:
         """
         Calls the memory server to find relevant history.
-        If found, formats it and prepends it to the user's query.
+        Returns the formatted exchanges, or "" if nothing is relevant.
         """
-        # Define a relevance threshold (lower L2 distance is better)
-        RELEVANCE_THRESHOLD = 300.0  # Adjust this based on your embedding model
+        # Define a relevance threshold (higher cosine similarity is better)
+        RELEVANCE_THRESHOLD = 0.6  # Adjust this based on your embedding model
 
         try:
             log("memory-inject", f"Searching history for query: {user_query}")
@@ -53,48 +111,47 @@ async def main():
                 {"input": {"query": user_query, "max_results": 2}}
             )
 
-            hist_json = json.loads(hist_raw.content[0].text)
-            matches = hist_json.get("result", {}).get("matches", [])
+            matches = _extract_matches(hist_raw)
 
             if not matches:
                 log("memory-inject", "No relevant history found.")
-                return user_query  # Return original query
+                return ""
 
             # Filter matches by the relevance threshold
-            relevant_matches = [m for m in matches if m.get("l2_distance", 1000) < RELEVANCE_THRESHOLD]
+            relevant_matches = [m for m in matches if m.get("cosine_similarity", 0.0) >= RELEVANCE_THRESHOLD]
 
             if not relevant_matches:
-                log("memory-inject", f"Matches found, but none below threshold {RELEVANCE_THRESHOLD}.")
-                return user_query  # Return original query
-
-            # Format the relevant history
-            historical_block = []
-            for conv in relevant_matches:
-                dt = datetime.datetime.fromtimestamp(conv['timestamp']).strftime('%Y-%m-%d')
-                historical_block.append(
-                    f"On {dt}, you had this exchange:\n"
-                    f"User: {conv['user_query']}\n"
-                    f"Agent: {conv['final_answer']}"
-                )
-
-            historical_summary = "\n\n---\n\n".join(historical_block)
-            log("memory-inject", "Injecting relevant historical context.")
-
-            # Return the new, combined prompt
-            return (
-                f"User's current query: {user_query}\n\n"
-                f"For your reference, here is some highly relevant context from your past conversations. "
-                f"Use this to inform your answer:\n\n"
-                f"{historical_summary}"
+                log("memory-inject", f"Matches found, but none above threshold {RELEVANCE_THRESHOLD}.")
+                return ""
+
+            # Format the relevant history. The "---" rule separates exchanges for the LLM.
+            historical_summary = "\n\n---\n\n".join(
+                f"On {datetime.date.fromtimestamp(timestamp).isoformat()}, you had this exchange:\n"
+                f"User: {past_query}\n"
+                f"Agent: {past_answer}"
+                for timestamp, past_query, past_answer in map(_EXCHANGE_FIELDS, relevant_matches)
             )
+            log("memory-inject", "Injecting relevant historical context.")
+            return historical_summary
 
         except Exception as e:
             log("memory-inject", f"Could not fetch historical context: {e}")
-            return user_query  # Fail safe: return original query
+            return ""  # Fail safe: no injected context
+
+    def inject_history(user_query: str, historical_summary: str) -> str:
+        """Prepends the user's query to the historical context, if there is any."""
+        if not historical_summary:
+            return user_query
+        return (
+            f"User's current query: {user_query}\n\n"
+            f"For your reference, here is some highly relevant context from your past conversations. "
+            f"Use this to inform your answer:\n\n"
+            f"{historical_summary}"
+        )
 
     try:
         while True:
-            user_input = input("🧑 What do you want to solve today? → ")
+            user_input = await read_input("🧑 What do you want to solve today? → ")
             if user_input.lower() == 'exit':
                 break
             if user_input.lower() == 'new':
@@ -111,18 +168,35 @@ async def main():
                 log("agent", "Sanitized user input via heuristics.")
             user_input = sanitized_input
 
+            cached_answer = exact_cache.get(user_input)
+            query_vec = None
+            if cached_answer is None:
+                cached_answer, query_vec = await response_cache.lookup(user_input)
+            if cached_answer is not None:
+                print(f"\n💡 Final Answer (cached): {cached_answer}")
+                continue
+            query = user_input
+
             # === 🧠 AUTOMATIC HISTORICAL CONTEXT INJECTION ===
-            # This is the "Selective Injection" step.
-            injected_user_input = await get_selectively_injected_context(user_input, multi_mcp)
+            # This is the "Selective Injection" step. It runs as a task so the
+            # memory-server round-trip overlaps with AgentContext setup below.
+            # The history is fetched once per query; follow-up steps reuse the
+            # task's result instead of searching again.
+            history_task = asyncio.create_task(get_relevant_history(user_input, multi_mcp))
             # =================================================
 
             while True:
-                context = AgentContext(
-                    user_input=injected_user_input,  # Use the new, context-aware input
+                # Profile/memory file I/O happens in a worker thread while the
+                # history lookup is in flight on the event loop.
+                context = await asyncio.to_thread(
+                    AgentContext,
+                    user_input=user_input,
                     session_id=current_session,
                     dispatcher=multi_mcp,
                     mcp_server_descriptions=mcp_servers,
                 )
+                # Use the new, context-aware input
+                context.user_input = inject_history(user_input, await history_task)
                 agent = AgentLoop(context)
                 if not current_session:
                     current_session = context.session_id
@@ -132,23 +206,28 @@ async def main():
                 if isinstance(result, dict):
                     answer = result["result"]
                     if "FINAL_ANSWER:" in answer:
-                        print(f"\n💡 Final Answer: {answer.split('FINAL_ANSWER:')[1].strip()}")
+                        final_answer = answer.split('FINAL_ANSWER:')[1].strip()
+                        print(f"\n💡 Final Answer: {final_answer}")
+                        if not final_answer.startswith("["):  # skip "[Max steps reached]" etc.
+                            exact_cache.put(query, final_answer)
+                            await response_cache.put(query, final_answer, query_vec)
                         break
                     elif "FURTHER_PROCESSING_REQUIRED:" in answer:
                         user_input = answer.split("FURTHER_PROCESSING_REQUIRED:")[1].strip()
                         log("agent", "Further processing required. Re-running loop...")
-
-                        # --- Re-inject context for the follow-up step ---
-                        injected_user_input = await get_selectively_injected_context(user_input, multi_mcp)
-                        continue  # Re-run agent with updated input
+                        continue  # Re-run agent with updated input (history is re-injected above)
                     else:
                         print(f"\n💡 Final Answer (raw): {answer}")
                         break
                 else:
                     print(f"\n💡 Final Answer (unexpected): {result}")
                     break
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, asyncio.CancelledError):
         print("\n👋 Received exit signal. Shutting down...")
+    finally:
+        prewarm_task.cancel()
+        exact_cache.save()
+        await multi_mcp.shutdown()
 
 
 if __name__ == "__main__":
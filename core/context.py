@@ -5,9 +5,9 @@ from modules.memory import MemoryManager, MemoryItem
 from core.session import MultiMCP  # For dispatcher typing
 from pathlib import Path
 import yaml
-import time
 import uuid
-from datetime import datetime
+import functools
+from datetime import datetime, timezone
 from pydantic import BaseModel
 
 class StrategyProfile(BaseModel):
@@ -18,10 +18,28 @@ class StrategyProfile(BaseModel):
     max_lifelines_per_step: int
 
 
+# libyaml-backed loader when PyYAML was built with it; same safe semantics.
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+@functools.lru_cache(maxsize=1)
+def load_profile_config() -> Dict[str, Any]:
+    """Parse config/profiles.yaml once per process; the file is static during a run."""
+    with open("config/profiles.yaml", "r") as f:
+        return yaml.load(f, Loader=YAML_LOADER)
+
+
+def format_server_descriptions(mcp_server_descriptions: Dict[str, Any]) -> str:
+    """One "- id: description" line per MCP server, as the perception prompt expects."""
+    return "\n".join(
+        f"- {server_id}: {server_info.get('description', 'No description available')}"
+        for server_id, server_info in mcp_server_descriptions.items()
+    )
+
+
 class AgentProfile:
     def __init__(self):
-        with open("config/profiles.yaml", "r") as f:
-            config = yaml.safe_load(f)
+        config = load_profile_config()
 
         self.name = config["agent"]["name"]
         self.id = config["agent"]["id"]
@@ -46,36 +64,51 @@ class AgentContext:
         dispatcher: Optional[MultiMCP] = None,
         mcp_server_descriptions: Optional[List[Any]] = None,
     ):
+        now = datetime.now().astimezone()  # single clock read, reused below
         if session_id is None:
-            today = datetime.now()
-            ts = int(time.time())
+            ts = int(now.timestamp())
             uid = uuid.uuid4().hex[:6]
-            session_id = f"{today.year}/{today.month:02}/{today.day:02}/session-{ts}-{uid}"
+            session_id = f"{now.year}/{now.month:02}/{now.day:02}/session-{ts}-{uid}"
 
         self.user_input = user_input
         self.agent_profile = AgentProfile()
-        self.memory = MemoryManager(session_id=session_id)
-        self.session_id = self.memory.session_id
+        self._memory: Optional[MemoryManager] = None  # opened on first use, see `memory`
+        self.session_id = session_id
         self.dispatcher = dispatcher  # 🆕 Added formally
         self.mcp_server_descriptions = mcp_server_descriptions  # 🆕 Added formally
         self.step = 0
         self.task_progress = []  # 🆕 Will track tool executions
+        self.tool_calls = []  # ToolCallResult traces, read by format_history_for_llm
         self.final_answer = None
         
 
-        # Log session start
-        self.add_memory(MemoryItem(
-            timestamp=time.time(),
-            text=f"Started new session with input: {user_input} at {datetime.utcnow().isoformat()}",
+        # Session-start record; written when memory is first touched so that
+        # turns which never reach a real step don't open or write the session file.
+        self._run_start_item = MemoryItem(
+            timestamp=now.timestamp(),
+            text=f"Started new session with input: {user_input} at {now.astimezone(timezone.utc).isoformat()}",
             type="run_metadata",
             session_id=self.session_id,
             tags=["run_start"],
             user_query=user_input,
             metadata={
-                "start_time": datetime.now().isoformat(),
-                "step": self.step
+                "start_time": now.isoformat(),
+                "step": self.step,
+                "user_query": user_input,  # read by the memory indexer instead of parsing `text`
             }
-        ))
+        )
+
+    @functools.cached_property
+    def server_descriptions_text(self) -> str:
+        """Server list for the perception prompt; the servers don't change within a context."""
+        return format_server_descriptions(self.mcp_server_descriptions or {})
+
+    @property
+    def memory(self) -> MemoryManager:
+        if self._memory is None:
+            self._memory = MemoryManager(session_id=self.session_id)
+            self._memory.add(self._run_start_item)
+        return self._memory
 
     def add_memory(self, item: MemoryItem):
         """Add item to memory"""
@@ -86,12 +119,13 @@ class AgentContext:
             return "No previous actions"
             
         history = []
+        n = len(self.tool_calls)
         for i, trace in enumerate(self.tool_calls, 1):
-            result_str = str(trace.result)
-            if i < len(self.tool_calls):  # Previous steps
-                if len(result_str) > 50:
-                    result_str = f"{result_str[:50]}... [RESPONSE TRUNCATED]"
-            # else: last step gets full result
+            result = trace.result
+            result_str = result if isinstance(result, str) else str(result)
+            if i < n and len(result_str) > 50:  # Previous steps
+                result_str = f"{result_str[:50]}... [RESPONSE TRUNCATED]"
+            # else: last step (or short result) is used as-is
             
             history.append(f"{i}. Used {trace.tool_name} with {trace.arguments}\nResult: {result_str}")
         
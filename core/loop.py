@@ -4,7 +4,7 @@ import asyncio
 from modules.perception import run_perception
 from modules.decision import generate_plan
 from modules.action import run_python_sandbox
-from modules.model_manager import ModelManager
+from modules.model_manager import get_model_manager
 from core.session import MultiMCP
 from core.strategy import select_decision_prompt_path
 from core.context import AgentContext
@@ -23,7 +23,7 @@ class AgentLoop:
     def __init__(self, context: AgentContext):
         self.context = context
         self.mcp = self.context.dispatcher
-        self.model = ModelManager()
+        self.model = get_model_manager()
 
     async def run(self):
         max_steps = self.context.agent_profile.strategy.max_steps
@@ -2,15 +2,175 @@
 
 import os
 import sys
-from typing import Optional, Any, List, Dict
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+import time
+import logging
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import TYPE_CHECKING, Optional, Any, List, Dict, Tuple
+import anyio
+from modules.tools import clear_tool_caches
+
+if TYPE_CHECKING:
+    # The mcp package is imported on first connection, not at module import.
+    from mcp import ClientSession, StdioServerParameters
+
+logger = logging.getLogger(__name__)
+
+# Resolved once: neither changes while the agent runs.
+_DEFAULT_CWD = os.getcwd()
+_PY = sys.executable
+
+_params_cache: Dict[tuple, "StdioServerParameters"] = {}
+
+
+def _server_params(command: str, script: str, cwd: str) -> "StdioServerParameters":
+    key = (command, script, cwd)
+    params = _params_cache.get(key)
+    if params is None:
+        from mcp import StdioServerParameters
+        params = _params_cache[key] = StdioServerParameters(command=command, args=[script], cwd=cwd)
+    return params
+
+
+class _PooledSession:
+    """
+    One long-lived stdio subprocess + initialized ClientSession.
+    The transport contexts are entered and exited by a dedicated owner task,
+    since anyio cancel scopes must be closed by the task that opened them.
+    """
+
+    def __init__(self, params: "StdioServerParameters"):
+        self.params = params
+        self.session: Optional["ClientSession"] = None
+        self.last_used = time.monotonic()
+        self.in_flight = 0  # calls currently using the session; it is never idle while > 0
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._error: Optional[BaseException] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+        await self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    async def _run(self):
+        from mcp import ClientSession
+        from mcp.client.stdio import stdio_client
+
+        try:
+            async with AsyncExitStack() as stack:
+                read, write = await stack.enter_async_context(stdio_client(self.params))
+                session = await stack.enter_async_context(ClientSession(read, write))
+                await session.initialize()
+                self.session = session
+                self._ready.set()
+                await self._closing.wait()
+        except Exception as e:
+            self._error = e
+        finally:
+            self.session = None
+            self._ready.set()
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def aclose(self):
+        self._closing.set()
+        if self._task is not None:
+            await self._task
+
+
+class MCPSessionPool:
+    """
+    Keeps one persistent MCP session per server, keyed by server script.
+    The subprocess and JSON-RPC handshake are paid once instead of per call.
+    Sessions idle for longer than idle_ttl, or whose transport broke, are
+    reopened on the next acquire(). A session with a call still running is
+    never treated as idle, however long that call takes.
+    """
+
+    RECONNECT_ERRORS = (
+        BrokenPipeError,
+        ConnectionError,
+        anyio.ClosedResourceError,
+        anyio.BrokenResourceError,
+        anyio.EndOfStream,
+    )
+
+    def __init__(self, idle_ttl: float = 300.0):
+        self.idle_ttl = idle_ttl
+        self._sessions: Dict[str, _PooledSession] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def acquire(self, key: str, params: "StdioServerParameters") -> "ClientSession":
+        return (await self._acquire(key, params)).session
+
+    async def _acquire(self, key: str, params: "StdioServerParameters", hold: bool = False) -> _PooledSession:
+        # Per-key lock so concurrent first calls share one connect.
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            pooled = self._sessions.get(key)
+            if pooled is not None and (
+                not pooled.alive
+                or (pooled.in_flight == 0 and time.monotonic() - pooled.last_used > self.idle_ttl)
+            ):
+                await self._close(key)
+                pooled = None
+            if pooled is None:
+                pooled = _PooledSession(params)
+                await pooled.start()
+                self._sessions[key] = pooled
+            pooled.last_used = time.monotonic()
+            if hold:
+                # Taken under the lock, so no other acquire can see it idle first.
+                pooled.in_flight += 1
+            return pooled
+
+    @staticmethod
+    def _release(pooled: _PooledSession):
+        pooled.in_flight -= 1
+        pooled.last_used = time.monotonic()
+
+    async def invalidate(self, key: str):
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            await self._close(key)
+
+    async def _close(self, key: str):
+        pooled = self._sessions.pop(key, None)
+        if pooled is not None:
+            try:
+                await pooled.aclose()
+            except Exception as e:
+                print(f"⚠️ Error closing MCP session for {key}: {e}")
+
+    async def call_tool(self, key: str, params: "StdioServerParameters", tool_name: str, arguments: dict) -> Any:
+        pooled = await self._acquire(key, params, hold=True)
+        try:
+            return await pooled.session.call_tool(tool_name, arguments=arguments)
+        except self.RECONNECT_ERRORS:
+            pass
+        finally:
+            self._release(pooled)
+
+        # Server went away underneath us: reconnect once and retry.
+        await self.invalidate(key)
+        pooled = await self._acquire(key, params, hold=True)
+        try:
+            return await pooled.session.call_tool(tool_name, arguments=arguments)
+        finally:
+            self._release(pooled)
+
+    async def shutdown(self):
+        for key in list(self._sessions):
+            await self._close(key)
 
 
 class MCP:
     """
-    Lightweight wrapper for one-time MCP tool calls using stdio transport.
-    Each call spins up a new subprocess and terminates cleanly.
+    Lightweight wrapper for MCP tool calls using stdio transport.
+    The server subprocess is started on first use and reused via the session pool.
     """
 
     def __init__(
@@ -18,80 +178,94 @@ class MCP:
         server_script: str = "mcp_server_2.py",
         working_dir: Optional[str] = None,
         server_command: Optional[str] = None,
+        pool: Optional[MCPSessionPool] = None,
     ):
         self.server_script = server_script
-        self.working_dir = working_dir or os.getcwd()
-        self.server_command = server_command or sys.executable
-        
-
-    async def list_tools(self):
-        server_params = StdioServerParameters(
-            command=self.server_command,
-            args=[self.server_script],
-            cwd=self.working_dir
-        )
-        async with stdio_client(server_params) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
-                tools_result = await session.list_tools()
-                return tools_result.tools
+        self.working_dir = working_dir or _DEFAULT_CWD
+        self.server_command = server_command or _PY
+        self.pool = pool or MCPSessionPool()
+        self.server_params = _server_params(self.server_command, self.server_script, self.working_dir)
 
-    async def call_tool(self, tool_name: str, arguments: dict) -> Any:
-        server_params = StdioServerParameters(
-            command=self.server_command,
-            args=[self.server_script],
-            cwd=self.working_dir
-        )
-        async with stdio_client(server_params) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
-                return await session.call_tool(tool_name, arguments=arguments)
+    @asynccontextmanager
+    async def session(self):
+        """
+        Yields this server's session so a caller can issue several calls on it:
+            async with mcp.session() as s:
+                await mcp.call_tool("a", {...}, session=s)
+        """
+        pooled = await self.pool._acquire(self.server_script, self.server_params, hold=True)
+        try:
+            yield pooled.session
+        finally:
+            self.pool._release(pooled)
+
+    async def list_tools(self, session: Optional["ClientSession"] = None):
+        if session is None:
+            session = await self.pool.acquire(self.server_script, self.server_params)
+        tools_result = await session.list_tools()
+        return tools_result.tools
+
+    @staticmethod
+    async def _call_tool_on(session: "ClientSession", tool_name: str, arguments: dict) -> Any:
+        return await session.call_tool(tool_name, arguments=arguments)
+
+    async def call_tool(self, tool_name: str, arguments: dict, session: Optional["ClientSession"] = None) -> Any:
+        if session is not None:
+            return await self._call_tool_on(session, tool_name, arguments)
+        return await self.pool.call_tool(self.server_script, self.server_params, tool_name, arguments)
+
+    async def shutdown(self):
+        await self.pool.shutdown()
 
 
 class MultiMCP:
     """
-    Stateless version: discovers tools from multiple MCP servers, but reconnects per tool call.
-    Each call_tool() uses a fresh session based on tool-to-server mapping.
+    Discovers tools from multiple MCP servers and routes each call_tool() to
+    the owning server over a pooled, persistent session.
     """
 
     def __init__(self, server_configs: List[dict]):
         self.server_configs = server_configs
+        self.pool = MCPSessionPool()
         self.tool_map: Dict[str, Dict[str, Any]] = {}  # tool_name → {config, tool}
         self.server_tools: Dict[str, List[Any]] = {}  # server_name -> list of tools
 
 
     async def initialize(self):
-        print("in MultiMCP initialize")
-        for config in self.server_configs:
-            try:
-                params = StdioServerParameters(
-                    command=sys.executable,
-                    args=[config["script"]],
-                    cwd=config.get("cwd", os.getcwd())
-                )
-                print(f"→ Scanning tools from: {config['script']} in {params.cwd}")
-                async with stdio_client(params) as (read, write):
-                    print("Connection established, creating session...")
-                    try:
-                        async with ClientSession(read, write) as session:
-                            print("[agent] Session created, initializing...")
-                            await session.initialize()
-                            print("[agent] MCP session initialized")
-                            tools = await session.list_tools()
-                            print(f"→ Tools received: {[tool.name for tool in tools.tools]}")
-                            for tool in tools.tools:
-                                self.tool_map[tool.name] = {
-                                    "config": config,
-                                    "tool": tool
-                                }
-                                server_key = config["id"]  # fallback to script name if no key
-                                if server_key not in self.server_tools:
-                                    self.server_tools[server_key] = []
-                                self.server_tools[server_key].append(tool)
-                    except Exception as se:
-                        print(f"❌ Session error: {se}")
-            except Exception as e:
-                print(f"❌ Error initializing MCP server {config['script']}: {e}")
+        logger.debug("in MultiMCP initialize")
+        # Servers are independent, so scan them concurrently: startup costs max(t_i), not sum(t_i).
+        results = await asyncio.gather(
+            *(self._scan(config) for config in self.server_configs),
+            return_exceptions=True,
+        )
+        # Fold in config order so later servers still win tool-name clashes, as before.
+        for config, result in zip(self.server_configs, results):
+            if isinstance(result, BaseException):
+                print(f"❌ Error initializing MCP server {config['script']}: {result}")
+                continue
+            _, tools = result
+            server_key = config["id"]
+            for tool in tools:
+                self.tool_map[tool.name] = {
+                    "config": config,
+                    "tool": tool
+                }
+                self.server_tools.setdefault(server_key, []).append(tool)
+        clear_tool_caches()
+
+    def _params(self, config: dict) -> "StdioServerParameters":
+        return _server_params(_PY, config["script"], config.get("cwd") or _DEFAULT_CWD)
+
+    async def _scan(self, config: dict):
+        """Lists one server's tools. The session stays pooled for later calls."""
+        params = self._params(config)
+        logger.debug("→ Scanning tools from: %s in %s", config["script"], params.cwd)
+        session = await self.pool.acquire(config["script"], params)
+        logger.debug("MCP session initialized for %s", config["script"])
+        tools = await session.list_tools()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("→ Tools received: %s", [tool.name for tool in tools.tools])
+        return config, tools.tools
 
     async def call_tool(self, tool_name: str, arguments: dict) -> Any:
         entry = self.tool_map.get(tool_name)
@@ -99,16 +273,31 @@ class MultiMCP:
             raise ValueError(f"Tool '{tool_name}' not found on any server.")
 
         config = entry["config"]
-        params = StdioServerParameters(
-            command=sys.executable,
-            args=[config["script"]],
-            cwd=config.get("cwd", os.getcwd())
-        )
+        return await self.pool.call_tool(config["script"], self._params(config), tool_name, arguments)
 
-        async with stdio_client(params) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
-                return await session.call_tool(tool_name, arguments)
+    async def call_tools_batch(self, calls: List[Tuple[str, dict]]) -> List[Any]:
+        """
+        Runs independent tool calls concurrently and returns results in call order.
+        Each server's session is acquired once up front; requests to the same
+        server are multiplexed over its stdio pair by request id.
+        """
+        routed = []
+        for tool_name, _ in calls:
+            entry = self.tool_map.get(tool_name)
+            if not entry:
+                raise ValueError(f"Tool '{tool_name}' not found on any server.")
+            routed.append(entry["config"])
+
+        servers = {config["script"]: config for config in routed}
+        await asyncio.gather(
+            *(self.pool.acquire(script, self._params(config)) for script, config in servers.items())
+        )
+        return await asyncio.gather(
+            *(
+                self.pool.call_tool(config["script"], self._params(config), tool_name, arguments)
+                for config, (tool_name, arguments) in zip(routed, calls)
+            )
+        )
 
     async def list_all_tools(self) -> List[str]:
         return list(self.tool_map.keys())
@@ -126,4 +315,4 @@ class MultiMCP:
 
 
     async def shutdown(self):
-        pass  # no persistent sessions to close
\ No newline at end of file
+        await self.pool.shutdown()
\ No newline at end of file
@@ -3,9 +3,9 @@
 from typing import List, Optional, Any
 from modules.perception import PerceptionResult
 from modules.memory import MemoryItem
-from modules.model_manager import ModelManager
+from modules.model_manager import get_model_manager
 from core.context import AgentContext
-from modules.tools import filter_tools_by_hint, summarize_tools, load_prompt
+from modules.tools import filter_tools_by_hint, summarize_tools, load_prompt, render_prompt
 
 # Optional fallback logger
 try:
@@ -16,18 +16,17 @@ except ImportError:
         now = datetime.datetime.now().strftime("%H:%M:%S")
         print(f"[{now}] [{stage}] {msg}")
 
+DECISION_PROMPT_PATHS = {
+    ("conservative", None): "prompts/decision_prompt_conservative.txt",
+    ("exploratory", "parallel"): "prompts/decision_prompt_exploratory_parallel.txt",
+    ("exploratory", "sequential"): "prompts/decision_prompt_exploratory_sequential.txt",
+}
+DEFAULT_DECISION_PROMPT_PATH = "prompts/decision_prompt_conservative.txt"  # safe fallback
+
 def select_decision_prompt_path(planning_mode: str, exploration_mode: Optional[str] = None) -> str:
     """Selects the appropriate decision prompt file based on planning strategy."""
-    if planning_mode == "conservative":
-        return "prompts/decision_prompt_conservative.txt"
-    elif planning_mode == "exploratory":
-        if exploration_mode == "parallel":
-            return "prompts/decision_prompt_exploratory_parallel.txt"
-        elif exploration_mode == "sequential":
-            return "prompts/decision_prompt_exploratory_sequential.txt"
-    return "prompts/decision_prompt_conservative.txt"  # safe fallback
-
-model = ModelManager()
+    key = (planning_mode, exploration_mode if planning_mode == "exploratory" else None)
+    return DECISION_PROMPT_PATHS.get(key, DEFAULT_DECISION_PROMPT_PATH)
 
 async def decide_next_action(
     context: AgentContext,
@@ -187,12 +186,13 @@ async def generate_plan(
 
     prompt_template = load_prompt(prompt_path)
 
-    final_prompt = prompt_template.format(
+    final_prompt = render_prompt(
+        prompt_template,
         tool_descriptions=tool_descriptions,
         user_input=perception.user_input
     )
 
-    raw = (await model.generate_text(final_prompt)).strip()
+    raw = (await get_model_manager().generate_text(final_prompt)).strip()
     log("plan", f"Generated solve():\n{raw}")
 
     return raw
@@ -200,13 +200,14 @@ async def generate_plan(
 # === MEMORY FALLBACK LOGIC ===
 def find_recent_successful_tools(memory_items: List[MemoryItem], limit: int = 5) -> List[str]:
     """Find recent successful tool names based on memory items."""
+    seen = set()
     successful_tools = []
 
     for item in reversed(memory_items):
-        if item.type == "tool_output" and item.success and item.tool_name:
-            if item.tool_name not in successful_tools:
-                successful_tools.append(item.tool_name)
-        if len(successful_tools) >= limit:
-            break
+        if item.type == "tool_output" and item.success and item.tool_name and item.tool_name not in seen:
+            seen.add(item.tool_name)
+            successful_tools.append(item.tool_name)
+            if len(successful_tools) >= limit:
+                break
 
     return successful_tools
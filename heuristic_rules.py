@@ -4,13 +4,17 @@ Utility functions that enforce lightweight heuristic input guardrails.
 
 import re
 
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 SLANG_REPLACEMENTS = {
     r"\bu\b": "you",
     r"\bur\b": "your",
     r"\bwanna\b": "want to",
     r"\bgonna\b": "going to",
     r"\bgotta\b": "have to",
-    r"\bpls\b": "please",
     r"\bpls?\b": "please",
     r"\btho\b": "though",
     r"\bimo\b": "in my opinion",
@@ -18,13 +22,13 @@ SLANG_REPLACEMENTS = {
     r"\bwtf\b": "what",
 }
 
-OFFENSIVE_WORDS = {
+OFFENSIVE_WORDS = frozenset({
     "damn",
     "shit",
     "fuck",
     "bitch",
     "bastard",
-}
+})
 
 BLOCKED_SUBJECTS = {
     "violence",
@@ -40,13 +44,85 @@ BLOCKED_SUBJECTS = {
     "drug manufacturing",
 }
 
+# Anything longer is rejected before any pattern runs.
+MAX_INPUT_LENGTH = 4000
+
 HIGH_RISK_VERBS = r"(?:make|build|assemble|manufacture|fabricate|construct|3d[- ]?print|cook(?: up)?|design)"
 HIGH_RISK_OBJECTS = r"(?:gun|firearm|weapon|bomb|grenade|explosive|pipe bomb|chemical weapon|improvised explosive|ied|poison|molotov|silencer)"
 DANGEROUS_PATTERNS = [
-    re.compile(rf"\b{HIGH_RISK_VERBS}\b[^\n]*\b{HIGH_RISK_OBJECTS}\b", re.IGNORECASE),
-    re.compile(rf"\b{HIGH_RISK_OBJECTS}\b[^\n]*\b{HIGH_RISK_VERBS}\b", re.IGNORECASE),
-    re.compile(r"\bhow to\b[^\n]*\b(gun|firearm|bomb|explosive|weapon)\b", re.IGNORECASE),
+    rf"\b{HIGH_RISK_VERBS}\b[^\n]*\b{HIGH_RISK_OBJECTS}\b",
+    rf"\b{HIGH_RISK_OBJECTS}\b[^\n]*\b{HIGH_RISK_VERBS}\b",
+    r"\bhow to\b[^\n]*\b(?:gun|firearm|bomb|explosive|weapon)\b",
 ]
+# All of the above as one alternation, so a suspicious input is scanned once.
+DANGEROUS_RE = re.compile(
+    "|".join(f"(?:{pattern})" for pattern in DANGEROUS_PATTERNS),
+    re.IGNORECASE,
+)
+
+# Literal fragments of the patterns above. Every DANGEROUS_PATTERNS match needs
+# one object keyword plus a verb keyword (or "how to"), so inputs lacking them
+# can skip the regexes entirely.
+HIGH_RISK_VERB_KEYWORDS = frozenset({
+    "make", "build", "assemble", "manufacture", "fabricate", "construct",
+    "3d", "cook", "design",
+})
+HIGH_RISK_OBJECT_KEYWORDS = frozenset({
+    "gun", "firearm", "weapon", "bomb", "grenade", "explosive", "ied",
+    "poison", "molotov", "silencer",
+})
+
+# Compiled once at import so the per-query path never goes through re's cache.
+# Slang expansion and profanity masking share one alternation, so the input is
+# walked once and the callback dispatches on the group that matched. No
+# replacement contains another slang or offensive word, so one pass equals the
+# old chain of substitutions.
+SLANG_REPL = {f"g{i}": replacement for i, replacement in enumerate(SLANG_REPLACEMENTS.values())}
+NORMALIZE_RE = re.compile(
+    "|".join(f"(?P<g{i}>{pattern})" for i, pattern in enumerate(SLANG_REPLACEMENTS))
+    + r"|(?P<offensive>\b(?:" + "|".join(re.escape(word) for word in sorted(OFFENSIVE_WORDS)) + r")\b)",
+    re.IGNORECASE,
+)
+# Every slang pattern starts with r"\b" followed by a literal letter; if none of
+# those letters and none of the offensive words' initials occur, the pass cannot
+# match and is skipped.
+NORMALIZE_FIRST_CHARS = frozenset(pattern[2] for pattern in SLANG_REPLACEMENTS) | frozenset(
+    word[0] for word in OFFENSIVE_WORDS
+)
+# One pass over the input covers the whole blocklist (plain substring semantics).
+# Prefer an Aho-Corasick automaton when pyahocorasick is installed; the
+# compiled alternation is the fallback.
+BLOCKED_RE = re.compile(
+    "|".join(re.escape(topic) for topic in sorted(BLOCKED_SUBJECTS)),
+    re.IGNORECASE,
+)
+if ahocorasick is not None:
+    BLOCKED_AC = ahocorasick.Automaton()
+    for topic in BLOCKED_SUBJECTS:
+        BLOCKED_AC.add_word(topic, topic)
+    BLOCKED_AC.make_automaton()
+else:
+    BLOCKED_AC = None
+
+
+def _mask(match: re.Match) -> str:
+    word = match.group(0)
+    if len(word) <= 2:
+        return "*" * len(word)
+    return word[0] + "*" * (len(word) - 2) + word[-1]
+
+
+def _normalize(match: re.Match) -> str:
+    group = match.lastgroup
+    if group == "offensive":
+        return _mask(match)
+    return SLANG_REPL[group]
+
+
+def _is_blocked(raw_text: str, lowered: str) -> bool:
+    if BLOCKED_AC is not None:
+        return next(BLOCKED_AC.iter(lowered), None) is not None
+    return BLOCKED_RE.search(raw_text) is not None
 
 
 def apply_input_heuristics(raw_text: str):
@@ -54,33 +130,24 @@ def apply_input_heuristics(raw_text: str):
     Returns (allowed_flag, sanitized_text, message_if_blocked).
     Sanitizes slang/offensive terms and blocks disallowed topics.
     """
-    normalized = raw_text.lower()
-    for topic in BLOCKED_SUBJECTS:
-        if topic in normalized:
-            return False, None, "I’m sorry, but I can’t assist with that topic."
-    for pattern in DANGEROUS_PATTERNS:
-        if pattern.search(raw_text):
-            return False, None, "I’m sorry, but I can’t assist with that topic."
+    if len(raw_text) > MAX_INPUT_LENGTH:
+        return False, None, "That message is too long. Could you shorten it?"
+
+    lowered = raw_text.casefold()
+    if _is_blocked(raw_text, lowered):
+        return False, None, "I’m sorry, but I can’t assist with that topic."
+
+    has_object = any(keyword in lowered for keyword in HIGH_RISK_OBJECT_KEYWORDS)
+    has_verb = any(keyword in lowered for keyword in HIGH_RISK_VERB_KEYWORDS)
+    if has_object and (has_verb or "how to" in lowered) and DANGEROUS_RE.search(raw_text):
+        return False, None, "I’m sorry, but I can’t assist with that topic."
 
     sanitized = raw_text
-    for pattern, replacement in SLANG_REPLACEMENTS.items():
-        sanitized = re.sub(pattern, replacement, sanitized, flags=re.IGNORECASE)
-
-    def _mask(match: re.Match) -> str:
-        word = match.group(0)
-        if len(word) <= 2:
-            return "*" * len(word)
-        return word[0] + "*" * (len(word) - 2) + word[-1]
-
-    for cuss in OFFENSIVE_WORDS:
-        sanitized = re.sub(
-            rf"\b{re.escape(cuss)}\b",
-            _mask,
-            sanitized,
-            flags=re.IGNORECASE,
-        )
-
-    sanitized = re.sub(r"\s+", " ", sanitized).strip()
+    if not NORMALIZE_FIRST_CHARS.isdisjoint(lowered):
+        sanitized = NORMALIZE_RE.sub(_normalize, sanitized)
+
+    # str.split() uses the same whitespace definition as \s, without the regex engine.
+    sanitized = " ".join(sanitized.split())
     if not sanitized:
         return False, None, "Could you please rephrase that?"
 
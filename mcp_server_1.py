@@ -4,6 +4,7 @@ from mcp.types import TextContent
 from mcp import types
 from PIL import Image as PILImage
 import math
+import functools
 import sys
 import os
 import json
@@ -77,13 +78,18 @@ def power(input: PowerInput) -> PowerOutput:
 def cbrt(input: CbrtInput) -> CbrtOutput:
     """Compute the cube root of a number. Usage: input={"input": {"a": 27}} result = await mcp.call_tool('cbrt', input)"""
     print("CALLED: cbrt(CbrtInput) -> CbrtOutput")
-    return CbrtOutput(result=input.a ** (1/3))
+    return CbrtOutput(result=math.cbrt(input.a))
 
 @mcp.tool()
 def factorial(input: FactorialInput) -> FactorialOutput:
     """Compute the factorial of a number. Usage: input={"input": {"a": 5}} result = await mcp.call_tool('factorial', input)"""
     print("CALLED: factorial(FactorialInput) -> FactorialOutput")
-    return FactorialOutput(result=math.factorial(input.a))
+    return FactorialOutput(result=_factorial(input.a))
+
+
+@functools.lru_cache(maxsize=4096)
+def _factorial(n: int) -> int:
+    return math.factorial(n)
 
 @mcp.tool()
 def remainder(input: RemainderInput) -> RemainderOutput:
@@ -119,8 +125,12 @@ def mine(input: MineInput) -> MineOutput:
 def create_thumbnail(input: CreateThumbnailInput) -> ImageOutput:
     """Create a 100x100 thumbnail from image. Usage: input={"input": {"image_path": "example.jpg"}} result = await mcp.call_tool('create_thumbnail', input)"""
     print("CALLED: create_thumbnail(CreateThumbnailInput) -> ImageOutput")
+    size = (100, 100)
     img = PILImage.open(input.image_path)
-    img.thumbnail((100, 100))
+    if img.format == "JPEG":
+        # Let libjpeg decode at a reduced DCT scale instead of full resolution.
+        img.draft("RGB", (size[0] * 2, size[1] * 2))
+    img.thumbnail(size, PILImage.Resampling.LANCZOS)
     return ImageOutput(data=img.tobytes(), format="png")
 
 @mcp.tool()
@@ -136,7 +146,7 @@ def strings_to_chars_to_int(input: StringsToIntsInput) -> StringsToIntsOutput:
 def int_list_to_exponential_sum(input: ExpSumInput) -> ExpSumOutput:
     """Sum exponentials of int list. Usage: input={"input": {"numbers": [65, 66, 67]}} result = await mcp.call_tool('int_list_to_exponential_sum', input)"""
     print("CALLED: int_list_to_exponential_sum(ExpSumInput) -> ExpSumOutput")
-    result = sum(math.exp(i) for i in input.numbers)
+    result = float(np.exp(np.asarray(input.numbers, dtype=np.float64)).sum())
     return ExpSumOutput(result=result)
 
 @mcp.tool()
@@ -144,12 +154,14 @@ def fibonacci_numbers(input: FibonacciInput) -> FibonacciOutput:
     """Generate first n Fibonacci numbers. Usage: input={"input": {"n": 10}} result = await mcp.call_tool('fibonacci_numbers', input)"""
     print("CALLED: fibonacci_numbers(FibonacciInput) -> FibonacciOutput")
     n = input.n
-    if n <= 0:
-        return FibonacciOutput(result=[])
-    fib_sequence = [0, 1]
-    for _ in range(2, n):
-        fib_sequence.append(fib_sequence[-1] + fib_sequence[-2])
-    return FibonacciOutput(result=fib_sequence[:n])
+    if n <= 0:
+        return FibonacciOutput(result=[])
+    sequence = [0] * n
+    a, b = 0, 1
+    for i in range(n):
+        sequence[i] = a
+        a, b = b, a + b
+    return FibonacciOutput(result=sequence)
 
 
 
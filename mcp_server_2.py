@@ -7,14 +7,21 @@ import math
 import sys
 import os
 import json
+try:
+    import orjson  # optional; much faster on large search payloads
+except ImportError:
+    orjson = None
 import faiss
 import numpy as np
 from pathlib import Path
 import requests
+from requests.adapters import HTTPAdapter
 from markitdown import MarkItDown
 import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from models import AddInput, AddOutput, SqrtInput, SqrtOutput, StringsToIntsInput, StringsToIntsOutput, ExpSumInput, ExpSumOutput, PythonCodeInput, PythonCodeOutput, UrlInput, FilePathInput, MarkdownInput, MarkdownOutput, ChunkListOutput, SearchDocumentsInput
-from tqdm import tqdm
 import hashlib
 from pydantic import BaseModel
 import subprocess
@@ -28,6 +35,8 @@ import base64 # ollama needs base64-encoded-image
 mcp = FastMCP("Calculator")
 
 EMBED_URL = "http://localhost:11434/api/embeddings"
+EMBED_BATCH_URL = "http://localhost:11434/api/embed"  # accepts a list of inputs
+EMBED_BATCH_SIZE = 64
 OLLAMA_CHAT_URL = "http://localhost:11434/api/chat"
 OLLAMA_URL = "http://localhost:11434/api/generate"
 EMBED_MODEL = "nomic-embed-text"
@@ -38,13 +47,204 @@ CHUNK_SIZE = 256
 CHUNK_OVERLAP = 40
 MAX_CHUNK_LENGTH = 512  # characters
 TOP_K = 3  # FAISS top-K matches
+EXTRACT_WORKERS = min(8, os.cpu_count() or 1)
+# PyMuPDF does not support multithreading; at most one thread may be inside it.
+MUPDF_LOCK = threading.Lock()
+# Vectors are L2-normalized and scored by inner product (cosine). Once the corpus
+# is large enough to train on, the flat index is rebuilt as an IVF index.
+INDEX_METRIC = "ip"
+IVF_MIN_VECTORS = 4096
+IVF_NPROBE = 8
+# Search only reads the index. IO_FLAG_MMAP maps the IVF inverted lists, so
+# only probed lists become resident; a small flat index is still read in full.
+INDEX_READ_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
 ROOT = Path(__file__).parent.resolve()
 
+# One keep-alive session for Ollama and web fetches, so repeated calls reuse
+# TCP/TLS connections instead of handshaking per request.
+HTTP_SESSION = requests.Session()
+HTTP_SESSION.headers["User-Agent"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32)
+HTTP_SESSION.mount("http://", _adapter)
+HTTP_SESSION.mount("https://", _adapter)
+
+
+class EmbeddingCache:
+    """Persistent (sha1(text), model) → vector store, so unchanged chunks and repeated queries skip Ollama."""
+
+    LOOKUP_CHUNK = 500  # stay under SQLite's bound-parameter limit
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS emb (h TEXT, m TEXT, v BLOB, PRIMARY KEY (h, m))")
+
+    def get_many(self, hashes: list[str], model: str) -> dict[str, np.ndarray]:
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        for start in range(0, len(unique), self.LOOKUP_CHUNK):
+            part = unique[start:start + self.LOOKUP_CHUNK]
+            rows = self.conn.execute(
+                f"SELECT h, v FROM emb WHERE m = ? AND h IN ({','.join('?' * len(part))})",
+                [model, *part],
+            )
+            for h, v in rows:
+                found[h] = np.frombuffer(v, dtype=np.float32)
+        return found
+
+    def put_many(self, items: dict[str, np.ndarray], model: str) -> None:
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO emb (h, m, v) VALUES (?, ?, ?)",
+            [(h, model, vec.astype(np.float32).tobytes()) for h, vec in items.items()],
+        )
+        self.conn.commit()
+
+
+EMBEDDING_CACHE = EmbeddingCache(ROOT / "faiss_index" / "embedding_cache.sqlite")
+
+
+class QueryResultCache:
+    """
+    Recent search results keyed by normalized query embedding. A query whose
+    cosine similarity to a cached one is >= threshold reuses its results, so
+    near-duplicate phrasings skip the index search. LRU with a TTL.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 256, ttl_seconds: float = 300.0):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.index = None
+        self.entries: OrderedDict[int, tuple[list[str], float]] = OrderedDict()  # id → (results, created_at)
+        self.next_id = 0
+
+    def clear(self) -> None:
+        self.index = None
+        self.entries.clear()
+
+    def _nearest(self, vec: np.ndarray) -> tuple[int, float]:
+        if not self.entries:
+            return -1, 0.0
+        sims, ids = self.index.search(vec, 1)
+        return int(ids[0][0]), float(sims[0][0])
+
+    def _remove(self, entry_id: int) -> None:
+        self.entries.pop(entry_id, None)
+        self.index.remove_ids(np.array([entry_id], dtype=np.int64))
+
+    def lookup(self, vec: np.ndarray) -> list[str] | None:
+        entry_id, sim = self._nearest(vec)
+        if entry_id not in self.entries or sim < self.threshold:
+            return None
+        results, created_at = self.entries[entry_id]
+        if time.time() - created_at > self.ttl_seconds:
+            self._remove(entry_id)
+            return None
+        self.entries.move_to_end(entry_id)
+        return results
+
+    def put(self, vec: np.ndarray, results: list[str]) -> None:
+        entry_id, sim = self._nearest(vec)
+        if entry_id in self.entries and sim >= self.threshold:
+            # Near-duplicate of a cached query: refresh that slot instead of adding one.
+            self.entries[entry_id] = (results, time.time())
+            self.entries.move_to_end(entry_id)
+            return
+
+        if self.index is None:
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(vec.shape[1]))
+        while len(self.entries) >= self.max_entries:
+            self._remove(next(iter(self.entries)))
+
+        entry_id = self.next_id
+        self.next_id += 1
+        self.index.add_with_ids(vec, np.array([entry_id], dtype=np.int64))
+        self.entries[entry_id] = (results, time.time())
+
+
+QUERY_CACHE = QueryResultCache()
+
+
+CHUNK_STORE_DIR = ROOT / "faiss_index" / "chunks"
+
+
+def save_chunk_store(metadata: list[dict], path: Path = CHUNK_STORE_DIR) -> None:
+    """
+    Persist chunk metadata column-wise: all chunk text as one UTF-8 blob plus
+    an offsets array, and per-chunk doc ids into a small name table. Each
+    column is a plain .npy file so ChunkStore can memory-map it.
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    docs = list(dict.fromkeys(m["doc"] for m in metadata))
+    doc_ids = {doc: i for i, doc in enumerate(docs)}
+    encoded = [m["chunk"].encode("utf-8") for m in metadata]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded], dtype=np.int64)
+
+    np.save(path / "contents.npy", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    np.save(path / "offsets.npy", offsets)
+    np.save(path / "doc_ids.npy", np.array([doc_ids[m["doc"]] for m in metadata], dtype=np.int32))
+    # chunk_id is always "<doc stem>_<n>", so only n is stored.
+    np.save(path / "chunk_nums.npy", np.array([int(m["chunk_id"].rsplit("_", 1)[1]) for m in metadata], dtype=np.int32))
+    (path / "docs.json").write_text(json.dumps(docs))
+
+
+class ChunkStore:
+    """Read side of save_chunk_store; rows decode lazily to the old metadata dicts."""
+
+    def __init__(self, path: Path = CHUNK_STORE_DIR):
+        self.contents = np.load(path / "contents.npy", mmap_mode="r")
+        self.offsets = np.load(path / "offsets.npy", mmap_mode="r")
+        self.doc_ids = np.load(path / "doc_ids.npy", mmap_mode="r")
+        self.chunk_nums = np.load(path / "chunk_nums.npy", mmap_mode="r")
+        self.docs = json.loads((path / "docs.json").read_text())
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def __getitem__(self, i: int) -> dict:
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        doc = self.docs[int(self.doc_ids[i])]
+        return {
+            "doc": doc,
+            "chunk": self.contents[start:end].tobytes().decode("utf-8"),
+            "chunk_id": f"{Path(doc).stem}_{int(self.chunk_nums[i])}",
+        }
+
+    def to_list(self) -> list[dict]:
+        return [self[i] for i in range(len(self))]
+
 
 def get_embedding(text: str) -> np.ndarray:
-    result = requests.post(EMBED_URL, json={"model": EMBED_MODEL, "prompt": text})
-    result.raise_for_status()
-    return np.array(result.json()["embedding"], dtype=np.float32)
+    return get_embeddings([text])[0]
+
+def get_embeddings(texts: list[str], batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+    """Embed many texts with one request per batch; returns a (len(texts), dim) float32 array."""
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+
+    hashes = [hashlib.sha1(text.encode("utf-8")).hexdigest() for text in texts]
+    vectors = EMBEDDING_CACHE.get_many(hashes, EMBED_MODEL)
+
+    # Embed each distinct uncached text once.
+    missing = {h: text for h, text in zip(hashes, texts) if h not in vectors}
+    if missing:
+        missing_hashes = list(missing)
+        fresh = {}
+        for start in range(0, len(missing_hashes), batch_size):
+            batch = missing_hashes[start:start + batch_size]
+            result = HTTP_SESSION.post(EMBED_BATCH_URL, json={"model": EMBED_MODEL, "input": [missing[h] for h in batch]})
+            result.raise_for_status()
+            embedded = np.asarray(result.json()["embeddings"], dtype=np.float32)
+            fresh.update(zip(batch, embedded))
+        EMBEDDING_CACHE.put_many(fresh, EMBED_MODEL)
+        vectors.update(fresh)
+
+    # Fill one preallocated matrix rather than building a list for np.stack to copy.
+    out = np.empty((len(hashes), len(vectors[hashes[0]])), dtype=np.float32)
+    for row, h in enumerate(hashes):
+        out[row] = vectors[h]
+    return out
 
 def chunk_text(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
     words = text.split()
@@ -84,7 +284,7 @@ Just respond in one word (Yes or No), and do not provide any further explanation
     print(f"  Chunk {index} → {chunk1[:60]}{'...' if len(chunk1) > 60 else ''}")
     print(f"  Chunk {index+1} → {chunk2[:60]}{'...' if len(chunk2) > 60 else ''}")
 
-    result = requests.post(OLLAMA_CHAT_URL, json={
+    result = HTTP_SESSION.post(OLLAMA_CHAT_URL, json={
         "model": PHI_MODEL,
         "messages": [{"role": "user", "content": prompt}],
         "stream": False
@@ -96,10 +296,16 @@ Just respond in one word (Yes or No), and do not provide any further explanation
 
 
 
+def _dumps(payload: dict) -> str:
+    if orjson is not None:
+        return orjson.dumps(payload).decode()
+    return json.dumps(payload)
+
+
 def _wrap_text_response(payload: dict) -> types.CallToolResult:
     """Return a JSON payload that downstream plans can json.loads()."""
     return types.CallToolResult(
-        content=[TextContent(type="text", text=json.dumps(payload))]
+        content=[TextContent(type="text", text=_dumps(payload))]
     )
 
 
@@ -111,9 +317,17 @@ def search_stored_documents(input: SearchDocumentsInput) -> types.CallToolResult
     query = input.query
     mcp_log("SEARCH", f"Query: {query}")
     try:
-        index = faiss.read_index(str(ROOT / "faiss_index" / "index.bin"))
-        metadata = json.loads((ROOT / "faiss_index" / "metadata.json").read_text())
         query_vec = get_embedding(query ).reshape(1, -1)
+        faiss.normalize_L2(query_vec)
+        cached = QUERY_CACHE.lookup(query_vec)
+        if cached is not None:
+            mcp_log("SEARCH", "Query cache hit")
+            return _wrap_text_response({"result": cached})
+
+        index = faiss.read_index(str(ROOT / "faiss_index" / "index.bin"), INDEX_READ_FLAGS)
+        metadata = ChunkStore()
+        if hasattr(index, "nprobe"):
+            index.nprobe = IVF_NPROBE
         _, I = index.search(query_vec, k=5)
         results = []
         for idx in I[0]:
@@ -121,6 +335,7 @@ def search_stored_documents(input: SearchDocumentsInput) -> types.CallToolResult
                 continue
             data = metadata[idx]
             results.append(f"{data['chunk']}\n[Source: {data['doc']}, ID: {data['chunk_id']}]")
+        QUERY_CACHE.put(query_vec, results)
         return _wrap_text_response({"result": results})
     except Exception as e:
         mcp_log("ERROR", f"Failed search for '{query}': {e}")
@@ -139,14 +354,14 @@ def caption_image(img_url_or_path: str) -> str:
 
     try:
         if img_url_or_path.startswith("http"): # for extract_web_pages
-            result = requests.get(img_url_or_path)
+            result = HTTP_SESSION.get(img_url_or_path)
             encoded_image = base64.b64encode(result.content).decode("utf-8")
         else:
             with open(full_path, "rb") as img_file:
                 encoded_image = base64.b64encode(img_file.read()).decode("utf-8")
 
         # Set stream=True to get the full generator-style output
-        with requests.post(OLLAMA_URL, json={
+        with HTTP_SESSION.post(OLLAMA_URL, json={
             "model": GEMMA_MODEL,
             "prompt": "If there is lot of text in the image, then ONLY reply back with exact text in the image, else Describe the image such that your result can replace 'alt-text' for it. Only explain the contents of the image and provide no further explaination.",
             "images": [encoded_image],
@@ -200,7 +415,15 @@ def replace_images_with_captions(markdown: str) -> str:
 def convert_webpage_url_into_markdown(input: UrlInput) -> MarkdownOutput:
     """Return clean webpage content without Ads, and clutter. Usage: input={{"input": {{"url": "https://example.com"}}}} result = await mcp.call_tool('convert_webpage_url_into_markdown', input)"""
 
-    downloaded = trafilatura.fetch_url(input.url)
+    try:
+        response = HTTP_SESSION.get(input.url, timeout=10)
+        response.raise_for_status()
+        # Raw bytes: trafilatura detects the encoding itself, as fetch_url did.
+        # response.text would assume ISO-8859-1 for text/html without a charset.
+        downloaded = response.content
+    except requests.RequestException as e:
+        mcp_log("WARN", f"Failed to download {input.url}: {e}")
+        downloaded = None
     if not downloaded:
         return MarkdownOutput(markdown="Failed to download the webpage.")
 
@@ -228,11 +451,12 @@ def extract_pdf(input: FilePathInput) -> MarkdownOutput:
     global_image_dir.mkdir(parents=True, exist_ok=True)
 
     # Actual markdown with relative image paths
-    markdown = pymupdf4llm.to_markdown(
-        input.file_path,
-        write_images=True,
-        image_path=str(global_image_dir)
-    )
+    with MUPDF_LOCK:
+        markdown = pymupdf4llm.to_markdown(
+            input.file_path,
+            write_images=True,
+            image_path=str(global_image_dir)
+        )
 
     # Re-point image links in the markdown
     markdown = re.sub(
@@ -251,10 +475,15 @@ def semantic_merge(text: str) -> list[str]:
     words = text.split()
     i = 0
     final_chunks = []
-
-    while i < len(words):
-        # 1. Take next chunk of words (and prepend leftovers if any)
-        chunk_words = words[i:i + WORD_LIMIT]
+    leftover_words: list[str] = []
+
+    while i < len(words) or leftover_words:
+        # 1. Take next chunk of words (and prepend leftovers if any). Leftovers are
+        # carried separately so the remaining word list is never rebuilt.
+        take = WORD_LIMIT - len(leftover_words)
+        chunk_words = leftover_words + words[i:i + take]
+        i += take
+        leftover_words = []
         chunk_text = " ".join(chunk_words).strip()
 
         prompt = f"""
@@ -274,7 +503,7 @@ Keep markdown formatting intact.
 """
 
         try:
-            result = requests.post(OLLAMA_CHAT_URL, json={
+            result = HTTP_SESSION.post(OLLAMA_CHAT_URL, json={
                 "model": PHI_MODEL,
                 "messages": [{"role": "user", "content": prompt}],
                 "stream": False
@@ -284,7 +513,7 @@ Keep markdown formatting intact.
             if reply:
                 # If LLM returned second part, separate it
                 split_point = chunk_text.find(reply)
-                if split_point != -1:
+                if split_point > 0:
                     first_part = chunk_text[:split_point].strip()
                     second_part = reply.strip()
 
@@ -292,8 +521,6 @@ Keep markdown formatting intact.
 
                     # Get remaining words from second_part and re-use them in next batch
                     leftover_words = second_part.split()
-                    words = leftover_words + words[i + WORD_LIMIT:]
-                    i = 0  # restart loop with leftover + remaining
                     continue
                 else:
                     # fallback: if split point not found
@@ -305,8 +532,6 @@ Keep markdown formatting intact.
             mcp_log("ERROR", f"Semantic chunking LLM error: {e}")
             final_chunks.append(chunk_text)
 
-        i += WORD_LIMIT
-
     return final_chunks
 
 
@@ -315,6 +540,41 @@ Keep markdown formatting intact.
 
 
 
+def extract_document_chunks(file: Path) -> list[str]:
+    """Convert one document to markdown and split it into chunks ([] if nothing was extracted)."""
+    mcp_log("PROC", f"Processing: {file.name}")
+    ext = file.suffix.lower()
+    markdown = ""
+
+    if ext == ".pdf":
+        mcp_log("INFO", f"Using MuPDF4LLM to extract {file.name}")
+        markdown = extract_pdf(FilePathInput(file_path=str(file))).markdown
+
+    elif ext in [".html", ".htm", ".url"]:
+        mcp_log("INFO", f"Using Trafilatura to extract {file.name}")
+        # Use the correctly named helper defined above
+        markdown = convert_webpage_url_into_markdown(
+            UrlInput(url=file.read_text().strip())
+        ).markdown
+
+    else:
+        # Fallback to MarkItDown for other formats
+        converter = MarkItDown()
+        mcp_log("INFO", f"Using MarkItDown fallback for {file.name}")
+        markdown = converter.convert(str(file)).text_content
+
+    if not markdown.strip():
+        mcp_log("WARN", f"No content extracted from {file.name}")
+        return []
+
+    if len(markdown.split()) < 10:
+        mcp_log("WARN", f"Content too short for semantic merge in {file.name} → Skipping chunking.")
+        return [markdown.strip()]
+
+    mcp_log("INFO", f"Running semantic merge on {file.name} with {len(markdown.split())} words")
+    return semantic_merge(markdown)
+
+
 def process_documents():
     """Process documents and create FAISS index using unified multimodal strategy."""
     mcp_log("INFO", "Indexing documents with unified RAG pipeline...")
@@ -323,91 +583,105 @@ def process_documents():
     INDEX_CACHE = ROOT / "faiss_index"
     INDEX_CACHE.mkdir(exist_ok=True)
     INDEX_FILE = INDEX_CACHE / "index.bin"
-    METADATA_FILE = INDEX_CACHE / "metadata.json"
+    METADATA_FILE = INDEX_CACHE / "metadata.json"  # legacy JSON layout, migrated below
     CACHE_FILE = INDEX_CACHE / "doc_index_cache.json"
+    PARAMS_FILE = INDEX_CACHE / "index_params.json"
 
     def file_hash(path):
         return hashlib.md5(Path(path).read_bytes()).hexdigest()
 
+    params = json.loads(PARAMS_FILE.read_text()) if PARAMS_FILE.exists() else {}
+    if params.get("metric") != INDEX_METRIC:
+        # Index from the old L2 layout: vectors aren't comparable, so rebuild from scratch.
+        for stale in (INDEX_FILE, METADATA_FILE, CACHE_FILE, CHUNK_STORE_DIR / "docs.json"):
+            stale.unlink(missing_ok=True)
+        params = {"metric": INDEX_METRIC, "nlist": None, "nprobe": IVF_NPROBE}
+
     CACHE_META = json.loads(CACHE_FILE.read_text()) if CACHE_FILE.exists() else {}
-    metadata = json.loads(METADATA_FILE.read_text()) if METADATA_FILE.exists() else []
+    if (CHUNK_STORE_DIR / "docs.json").exists():
+        metadata = ChunkStore().to_list()
+    elif METADATA_FILE.exists():
+        metadata = json.loads(METADATA_FILE.read_text())
+        save_chunk_store(metadata)
+        METADATA_FILE.unlink()
+    else:
+        metadata = []
     index = faiss.read_index(str(INDEX_FILE)) if INDEX_FILE.exists() else None
 
+    changed = []
     for file in DOC_PATH.glob("*.*"):
         fhash = file_hash(file)
         if file.name in CACHE_META and CACHE_META[file.name] == fhash:
             mcp_log("SKIP", f"Skipping unchanged file: {file.name}")
             continue
+        changed.append((file, fhash))
+
+    # Extraction is slow, mostly waiting on the network (Trafilatura fetches, image
+    # captions, LLM chunking), so files run on a thread pool. MuPDF is not
+    # thread-safe: PDF conversion itself is serialized by MUPDF_LOCK. Embedding
+    # and index writes stay on this thread and start as soon as a file is ready.
+    with ThreadPoolExecutor(max_workers=EXTRACT_WORKERS) as pool:
+        futures = {pool.submit(extract_document_chunks, file): (file, fhash) for file, fhash in changed}
+        for future in as_completed(futures):
+            file, fhash = futures[future]
+            try:
+                chunks = future.result()
+                if not chunks:
+                    continue
 
-        mcp_log("PROC", f"Processing: {file.name}")
-        try:
-            ext = file.suffix.lower()
-            markdown = ""
-
-            if ext == ".pdf":
-                mcp_log("INFO", f"Using MuPDF4LLM to extract {file.name}")
-                markdown = extract_pdf(FilePathInput(file_path=str(file))).markdown
-
-            elif ext in [".html", ".htm", ".url"]:
-                mcp_log("INFO", f"Using Trafilatura to extract {file.name}")
-                # Use the correctly named helper defined above
-                markdown = convert_webpage_url_into_markdown(
-                    UrlInput(url=file.read_text().strip())
-                ).markdown
-
-            else:
-                # Fallback to MarkItDown for other formats
-                converter = MarkItDown()
-                mcp_log("INFO", f"Using MarkItDown fallback for {file.name}")
-                markdown = converter.convert(str(file)).text_content
-
-            if not markdown.strip():
-                mcp_log("WARN", f"No content extracted from {file.name}")
-                continue
-
-            if len(markdown.split()) < 10:
-                mcp_log("WARN", f"Content too short for semantic merge in {file.name} → Skipping chunking.")
-                chunks = [markdown.strip()]
-            else:
-                mcp_log("INFO", f"Running semantic merge on {file.name} with {len(markdown.split())} words")
-                chunks = semantic_merge(markdown)
-
-
-            embeddings_for_file = []
-            new_metadata = []
-            for i, chunk in enumerate(tqdm(chunks, desc=f"Embedding {file.name}")):
-                embedding = get_embedding(chunk)
-                embeddings_for_file.append(embedding)
-                new_metadata.append({
-                    "doc": file.name,
-                    "chunk": chunk,
-                    "chunk_id": f"{file.stem}_{i}"
-                })
-
-            if embeddings_for_file:
-                if index is None:
-                    dim = len(embeddings_for_file[0])
-                    index = faiss.IndexFlatL2(dim)
-                index.add(np.stack(embeddings_for_file))
-                metadata.extend(new_metadata)
-                CACHE_META[file.name] = fhash
-
-                # ✅ Immediately save index and metadata
-                CACHE_FILE.write_text(json.dumps(CACHE_META, indent=2))
-                METADATA_FILE.write_text(json.dumps(metadata, indent=2))
-                faiss.write_index(index, str(INDEX_FILE))
-                mcp_log("SAVE", f"Saved FAISS index and metadata after processing {file.name}")
-
-        except Exception as e:
-            mcp_log("ERROR", f"Failed to process {file.name}: {e}")
+                mcp_log("INFO", f"Embedding {len(chunks)} chunks of {file.name}")
+                embeddings_for_file = get_embeddings(chunks)
+                new_metadata = [
+                    {
+                        "doc": file.name,
+                        "chunk": chunk,
+                        "chunk_id": f"{file.stem}_{i}"
+                    }
+                    for i, chunk in enumerate(chunks)
+                ]
+
+                if len(embeddings_for_file):
+                    faiss.normalize_L2(embeddings_for_file)
+                    if index is None:
+                        dim = embeddings_for_file.shape[1]
+                        index = faiss.IndexFlatIP(dim)
+                    index.add(embeddings_for_file)
+                    metadata.extend(new_metadata)
+                    CACHE_META[file.name] = fhash
+
+                    # ✅ Immediately save index and metadata
+                    CACHE_FILE.write_text(json.dumps(CACHE_META, indent=2))
+                    save_chunk_store(metadata)
+                    faiss.write_index(index, str(INDEX_FILE))
+                    PARAMS_FILE.write_text(json.dumps(params, indent=2))
+                    mcp_log("SAVE", f"Saved FAISS index and metadata after processing {file.name}")
+
+            except Exception as e:
+                mcp_log("ERROR", f"Failed to process {file.name}: {e}")
+
+    if index is not None and params["nlist"] is None and index.ntotal >= IVF_MIN_VECTORS:
+        # Flat search is O(N) per query; switch to IVF once there's enough data to train it.
+        vectors = index.reconstruct_n(0, index.ntotal)
+        nlist = int(4 * np.sqrt(index.ntotal))
+        quantizer = faiss.IndexFlatIP(index.d)
+        ivf = faiss.IndexIVFFlat(quantizer, index.d, nlist, faiss.METRIC_INNER_PRODUCT)
+        ivf.train(vectors)
+        ivf.add(vectors)
+        params["nlist"] = nlist
+        faiss.write_index(ivf, str(INDEX_FILE))
+        PARAMS_FILE.write_text(json.dumps(params, indent=2))
+        mcp_log("SAVE", f"Rebuilt FAISS index as IVF (nlist={nlist}) over {ivf.ntotal} vectors")
+
+    QUERY_CACHE.clear()  # cached results may point at stale chunks
 
 
 
 def ensure_faiss_ready():
     from pathlib import Path
     index_path = ROOT / "faiss_index" / "index.bin"
-    meta_path = ROOT / "faiss_index" / "metadata.json"
-    if not (index_path.exists() and meta_path.exists()):
+    meta_path = CHUNK_STORE_DIR / "docs.json"
+    params_path = ROOT / "faiss_index" / "index_params.json"
+    if not (index_path.exists() and meta_path.exists() and params_path.exists()):
         mcp_log("INFO", "Index not found — running process_documents()...")
         process_documents()
     else:
@@ -7,11 +7,12 @@ import urllib.parse
 import sys
 import traceback
 import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 import time
 import re
 from pydantic import BaseModel, Field
-from models import SearchInput, UrlInput
+from models import SearchInput, UrlInput, UrlListInput, UrlContentsOutput
 from models import PythonCodeOutput  # Import the models we need
 
 
@@ -50,8 +51,9 @@ class DuckDuckGoSearcher:
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
     }
 
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
         self.rate_limiter = RateLimiter()
+        self.client = client or httpx.AsyncClient()
 
     def format_results_for_llm(self, results: List[SearchResult]) -> str:
         """Format results in a natural language style that's easier for LLMs to process"""
@@ -85,11 +87,10 @@ class DuckDuckGoSearcher:
 
             await ctx.info(f"Searching DuckDuckGo for: {query}")
 
-            async with httpx.AsyncClient() as client:
-                result = await client.post(
-                    self.BASE_URL, data=data, headers=self.HEADERS, timeout=30.0
-                )
-                result.raise_for_status()
+            result = await self.client.post(
+                self.BASE_URL, data=data, headers=self.HEADERS, timeout=30.0
+            )
+            result.raise_for_status()
 
             # Parse HTML result
             soup = BeautifulSoup(result.text, "html.parser")
@@ -149,8 +150,9 @@ class DuckDuckGoSearcher:
 
 
 class WebContentFetcher:
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
         self.rate_limiter = RateLimiter(requests_per_minute=20)
+        self.client = client or httpx.AsyncClient()
 
     async def fetch_and_parse(self, url: str, ctx: Context) -> str:
         """Fetch and parse content from a webpage"""
@@ -159,38 +161,18 @@ class WebContentFetcher:
 
             await ctx.info(f"Fetching content from: {url}")
 
-            async with httpx.AsyncClient() as client:
-                result = await client.get(
-                    url,
-                    headers={
-                        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-                    },
-                    follow_redirects=True,
-                    timeout=30.0,
-                )
-                result.raise_for_status()
-
-            # Parse the HTML
-            soup = BeautifulSoup(result.text, "html.parser")
-
-            # Remove script and style elements
-            for element in soup(["script", "style", "nav", "header", "footer"]):
-                element.decompose()
-
-            # Get the text content
-            text = soup.get_text()
-
-            # Clean up the text
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = " ".join(chunk for chunk in chunks if chunk)
-
-            # Remove extra whitespace
-            text = re.sub(r"\s+", " ", text).strip()
+            result = await self.client.get(
+                url,
+                headers={
+                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+                },
+                follow_redirects=True,
+                timeout=30.0,
+            )
+            result.raise_for_status()
 
-            # Truncate if too long
-            if len(text) > 8000:
-                text = text[:8000] + "... [content truncated]"
+            # Parsing is CPU-bound; keep it off the event loop so other fetches proceed.
+            text = await asyncio.to_thread(self.html_to_text, result.text)
 
             await ctx.info(
                 f"Successfully fetched and parsed content ({len(text)} characters)"
@@ -207,11 +189,49 @@ class WebContentFetcher:
             await ctx.error(f"Error fetching content from {url}: {str(e)}")
             return f"Error: An unexpected error occurred while fetching the webpage ({str(e)})"
 
+    @staticmethod
+    def html_to_text(html: str) -> str:
+        # Parse the HTML
+        soup = BeautifulSoup(html, "html.parser")
+
+        # Remove script and style elements
+        for element in soup(["script", "style", "nav", "header", "footer"]):
+            element.decompose()
+
+        # Get the text content
+        text = soup.get_text()
+
+        # Clean up the text
+        lines = (line.strip() for line in text.splitlines())
+        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+        text = " ".join(chunk for chunk in chunks if chunk)
+
+        # Remove extra whitespace
+        text = re.sub(r"\s+", " ", text).strip()
+
+        # Truncate if too long
+        if len(text) > 8000:
+            text = text[:8000] + "... [content truncated]"
+        return text
+
+
+@asynccontextmanager
+async def close_http_client(server: FastMCP):
+    """Server lifespan: release the shared client's pooled connections on shutdown."""
+    try:
+        yield {}
+    finally:
+        await http_client.aclose()
+
 
 # Initialize FastMCP server
-mcp = FastMCP("ddg-search")
-searcher = DuckDuckGoSearcher()
-fetcher = WebContentFetcher()
+mcp = FastMCP("ddg-search", lifespan=close_http_client)
+# Shared by search and fetch so connections (and TLS sessions) stay warm between tool calls.
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=32)
+)
+searcher = DuckDuckGoSearcher(http_client)
+fetcher = WebContentFetcher(http_client)
 
 
 @mcp.tool()
@@ -231,6 +251,13 @@ async def download_raw_html_from_url(input: UrlInput, ctx: Context) -> str:
     return PythonCodeOutput(result=await fetcher.fetch_and_parse(input.url, ctx))
 
 
+@mcp.tool()
+async def download_urls(input: UrlListInput, ctx: Context) -> UrlContentsOutput:
+    """Fetch several webpages concurrently, results in input order. Usage: input={"input": {"urls": ["https://example.com", "https://example.org"]} } result = await mcp.call_tool('download_urls', input)"""
+    texts = await asyncio.gather(*(fetcher.fetch_and_parse(url, ctx) for url in input.urls))
+    return UrlContentsOutput(result=list(texts))
+
+
 if __name__ == "__main__":
     print("mcp_server_3.py starting")
     if len(sys.argv) > 1 and sys.argv[1] == "dev":
@@ -167,6 +167,12 @@ class SearchDocumentsInput(BaseModel):
 class UrlInput(BaseModel):
     url: str
 
+class UrlListInput(BaseModel):
+    urls: List[str]
+
+class UrlContentsOutput(BaseModel):
+    result: List[str]
+
 class FilePathInput(BaseModel):
     file_path: str
 
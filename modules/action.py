@@ -3,6 +3,7 @@
 from typing import Dict, Any, Union
 from pydantic import BaseModel
 import asyncio
+import functools
 import types
 import json
 
@@ -24,6 +25,12 @@ class ToolCallResult(BaseModel):
 
 MAX_TOOL_CALLS_PER_PLAN = 5
 
+
+@functools.lru_cache(maxsize=256)
+def _compile_plan(code: str):
+    # Retries of the same plan skip parsing and bytecode compilation.
+    return compile(code, "<solve_plan>", "exec")
+
 async def run_python_sandbox(code: str, dispatcher: Any) -> str:
     print("[action] 🔍 Entered run_python_sandbox()")
 
@@ -60,7 +67,7 @@ async def run_python_sandbox(code: str, dispatcher: Any) -> str:
         sandbox.__dict__["re"] = re
 
         # Execute solve fn dynamically
-        exec(compile(code, "<solve_plan>", "exec"), sandbox.__dict__)
+        exec(_compile_plan(code), sandbox.__dict__)
 
         solve_fn = sandbox.__dict__.get("solve")
         if solve_fn is None:
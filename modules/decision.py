@@ -1,7 +1,7 @@
 from typing import List, Optional
 from modules.perception import PerceptionResult
 from modules.memory import MemoryItem
-from modules.model_manager import ModelManager
+from modules.model_manager import get_model_manager
 from modules.tools import load_prompt
 import re
 
@@ -14,11 +14,12 @@ except ImportError:
         now = datetime.datetime.now().strftime("%H:%M:%S")
         print(f"[{now}] [{stage}] {msg}")
 
-model = ModelManager()
-
-
 # prompt_path = "prompts/decision_prompt.txt"
 
+SOLVE_RE = re.compile(r"^\s*(?:async\s+)?def\s+solve\s*\(", re.MULTILINE)
+# Placeholders and the {{ / }} escapes, substituted in one pass over the template.
+PLACEHOLDER_RE = re.compile(r"\{\{|\}\}|\{(tool_descriptions|user_input|memory_texts|step_num|max_steps)\}")
+
 async def generate_plan(
     user_input: str, 
     perception: PerceptionResult,
@@ -35,23 +36,23 @@ async def generate_plan(
 
     prompt_template = load_prompt(prompt_path)
 
-    prompt = prompt_template
     replacements = {
-        "{tool_descriptions}": tool_descriptions or "None",
-        "{user_input}": user_input or "",
-        "{memory_texts}": memory_texts,
-        "{step_num}": str(step_num),
-        "{max_steps}": str(max_steps),
+        "tool_descriptions": tool_descriptions or "None",
+        "user_input": user_input or "",
+        "memory_texts": memory_texts,
+        "step_num": str(step_num),
+        "max_steps": str(max_steps),
     }
 
-    for placeholder, value in replacements.items():
-        prompt = prompt.replace(placeholder, str(value))
+    def substitute(match: re.Match) -> str:
+        name = match.group(1)
+        return replacements[name] if name else match.group(0)[0]
 
-    prompt = prompt.replace("{{", "{").replace("}}", "}")
+    prompt = PLACEHOLDER_RE.sub(substitute, prompt_template)
 
 
     try:
-        raw = (await model.generate_text(prompt)).strip()
+        raw = (await get_model_manager().generate_text(prompt)).strip()
         log("plan", f"LLM output: {raw}")
 
         # If fenced in ```python ... ```, extract
@@ -60,7 +61,7 @@ async def generate_plan(
             if raw.lower().startswith("python"):
                 raw = raw[len("python"):].strip()
 
-        if re.search(r"^\s*(async\s+)?def\s+solve\s*\(", raw, re.MULTILINE):
+        if SOLVE_RE.search(raw):
             return raw  # ✅ Correct, it's a full function
         else:
             log("plan", "⚠️ LLM did not return a valid solve(). Defaulting to FINAL_ANSWER")
@@ -1,13 +1,30 @@
 from mcp.server.fastmcp import FastMCP
+import asyncio
 import faiss
 import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import hashlib
+import multiprocessing
+import sqlite3
+import threading
+try:
+    import orjson  # optional; faster session and metadata loads
+except ImportError:
+    orjson = None
+try:
+    from watchdog.observers import Observer  # optional; avoids rescanning history per search
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
 import os
+import re
 import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 # ========================= CONFIG =========================
 # --- FAISS/Embedding Config ---
@@ -17,11 +34,44 @@ INDEX_DIR = ROOT / "memory_faiss_index"
 INDEX_DIR.mkdir(exist_ok=True)
 INDEX_FILE = INDEX_DIR / "index.bin"
 METADATA_FILE = INDEX_DIR / "metadata.json"
+# Index metric plus each session file's mtime at last index
+INDEX_STATE_FILE = INDEX_DIR / "index_state.json"
+# Query inside a run_start text, for sessions saved before it became a metadata field
+SESSION_START_RE = re.compile(r"Started new session with input:(.*?)(?: at |\Z)", re.DOTALL)
+EMBED_CACHE_FILE = INDEX_DIR / "emb_cache.sqlite"
+EMBED_CACHE_MAX_ENTRIES = 50_000
 
 # --- Ollama Embedding Service Config ---
 EMBED_URL = "http://localhost:11434/api/embeddings"
 EMBED_MODEL = "nomic-embed-text"
+EMBED_WORKERS = 8  # concurrent embedding requests during an index rebuild
+# Session parsing is CPU-bound JSON work; large rebuilds spread it over processes.
+PARSE_WORKERS = min(8, os.cpu_count() or 1)
+PARSE_POOL_MIN_FILES = 256  # below this, process start-up costs more than it saves
+# The server runs watcher, search and embedding threads, and forking while one
+# of them holds a lock can deadlock the child, so workers never come from fork.
+PARSE_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
 EMBED_DIM: Optional[int] = None
+# Vectors are L2-normalized and scored by inner product, i.e. cosine similarity.
+INDEX_METRIC = "ip"
+# Stored as fp16 scalars: half the memory and bandwidth of float32, no training
+# pass, and a negligible change to unit-vector similarities.
+INDEX_CODEC = "fp16"
+# metadata.json keeps only where each pair lives (source_file + pair ordinal);
+# the question and answer text is read back from the session file for hits.
+METADATA_LAYOUT = "compact"
+QA_TEXT_FIELDS = ("user_query", "final_answer")
+# Below this many Q&A pairs brute force is exact and already fast; above it the
+# index is an HNSW graph so query cost grows ~log N instead of linearly.
+HNSW_MIN_VECTORS = 1000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+# IO_FLAG_MMAP only maps IVF inverted lists, which these index types don't have.
+# IO_FLAG_MMAP_IFC maps the scalar-quantized codes instead (the HNSW graph is
+# still read into RAM); faiss builds without it read the whole file.
+INDEX_READ_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_READ_ONLY
 EMBED_SERVICE_READY = False
 
 
@@ -31,18 +81,86 @@ class SearchInput(BaseModel):
     max_results: int = Field(default=3, ge=1, le=10)
 
 
+class BatchSearchInput(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=16)
+    max_results: int = Field(default=3, ge=1, le=10)
+
+
 mcp = FastMCP("memory-service")
 
+# One keep-alive session for Ollama, so embedding calls reuse a pooled
+# connection instead of opening a new one per request.
+HTTP_SESSION = requests.Session()
+HTTP_SESSION.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=EMBED_WORKERS))
+# Searches run in worker threads; only one of them may update the index at a time.
+INDEX_LOCK = threading.Lock()
+
 
 # ========================= HELPERS =========================
 def mcp_log(msg: str):
     print(f"[memory-server] {msg}", file=sys.stderr)
 
 
+class EmbeddingCache:
+    """
+    Persistent sha256(model, text) -> vector store, so rebuilds and repeated
+    queries skip the embedding service. Every vector is also filed under its
+    text's normalized form (case, whitespace and trailing punctuation folded),
+    so trivially different spellings of a seen text reuse its vector. Oldest
+    entries are trimmed once the table grows past max_entries.
+    """
+
+    TRIM_EVERY = 256  # puts between size checks
+
+    def __init__(self, path: Path, max_entries: int = EMBED_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()  # rebuilds embed from a thread pool
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS emb (key TEXT PRIMARY KEY, vec BLOB)")
+        self.puts = 0
+
+    @staticmethod
+    def _key(text: str, model: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    @classmethod
+    def _normalized_key(cls, text: str, model: str) -> str:
+        normalized = " ".join(text.split()).lower().rstrip(" .!?")
+        return cls._key(normalized, f"{model}\0normalized")
+
+    def get(self, text: str, model: str) -> Optional[np.ndarray]:
+        exact = self._key(text, model)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT vec FROM emb WHERE key IN (?, ?) ORDER BY key = ? DESC LIMIT 1",
+                (exact, self._normalized_key(text, model), exact),
+            ).fetchone()
+        return np.frombuffer(row[0], dtype=np.float32) if row else None
+
+    def put(self, text: str, model: str, vec: np.ndarray):
+        blob = vec.astype(np.float32).tobytes()
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO emb (key, vec) VALUES (?, ?)",
+                [(self._key(text, model), blob), (self._normalized_key(text, model), blob)],
+            )
+            self.puts += 1
+            if self.puts % self.TRIM_EVERY == 0:
+                self.conn.execute(
+                    "DELETE FROM emb WHERE rowid IN (SELECT rowid FROM emb ORDER BY rowid "
+                    "LIMIT max(0, (SELECT COUNT(*) FROM emb) - ?))",
+                    (self.max_entries,),
+                )
+            self.conn.commit()
+
+
+EMBEDDING_CACHE = EmbeddingCache(EMBED_CACHE_FILE)
+
+
 def _request_embedding(text: str, timeout: float = 15.0) -> np.ndarray:
     """Low-level helper that calls the embedding service."""
     payload = {"model": EMBED_MODEL, "prompt": text}
-    resp = requests.post(EMBED_URL, json=payload, timeout=timeout)
+    resp = HTTP_SESSION.post(EMBED_URL, json=payload, timeout=timeout)
     resp.raise_for_status()
     data = resp.json()
     vector = data.get("embedding")
@@ -74,174 +192,422 @@ def get_embedding(text: str) -> np.ndarray:
     global EMBED_SERVICE_READY, EMBED_DIM
     if not text.strip():
         text = "empty"  # Handle empty strings
-    emb = _request_embedding(text, timeout=15.0)
-    EMBED_SERVICE_READY = True
+    emb = EMBEDDING_CACHE.get(text, EMBED_MODEL)
+    if emb is None:
+        emb = _request_embedding(text, timeout=15.0)
+        EMBED_SERVICE_READY = True
+        EMBEDDING_CACHE.put(text, EMBED_MODEL, emb)
     EMBED_DIM = emb.shape[0]
     return emb
 
 
-def get_latest_file_mtime(dir_path: Path) -> float:
-    """Gets the modification time of the newest file in the directory tree."""
-    max_mtime = 0.0
-    for root, _, files in os.walk(dir_path):
-        for f in files:
-            if f.endswith(".json"):
-                mtime = (Path(root) / f).stat().st_mtime
-                if mtime > max_mtime:
-                    max_mtime = mtime
-    return max_mtime
+def scan_session_files() -> Dict[str, float]:
+    """Maps every session file (relative to ROOT) to its modification time."""
+    return {
+        str(json_path.relative_to(ROOT)): json_path.stat().st_mtime
+        for json_path in MEMORY_DIR.rglob("session-*.json")
+    }
 
 
 # ========================= INDEXING LOGIC =========================
-def build_memory_index():
-    """
-    Builds a FAISS index from all conversation JSONs.
-    Combines GPT-5's structured parsing with Grok's semantic indexing.
-    """
-    if not ensure_embedding_service():
-        mcp_log("Skipping index rebuild until embedding service is available.")
-        return
-
-    mcp_log("Rebuilding historical conversation index...")
-    embeddings = []
+def parse_session_file(json_path: Path) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Extracts the Q&A pairs of one conversation JSON.
+    Returns (texts to embed, metadata) in matching order.
+    """
+    texts = []
     metadata = []
 
-    for json_path in MEMORY_DIR.rglob("session-*.json"):
-        try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                items = json.load(f)
-
-            # Sort by timestamp to ensure correct Q&A order
-            items.sort(key=lambda x: x.get("timestamp", 0.0))
-
-            current_query = None
-            current_intent = None
-            current_query_time = 0.0
-
-            for item in items:
-                item_type = item.get("type")
-
-                if item_type == "run_metadata":
-                    text = item.get("text", "")
-                    marker = "Started new session with input:"
-                    if marker in text:
-                        # This is a new user query. Store it.
-                        query_text = text.split(marker, 1)[1].split(" at ", 1)[0].strip()
-                        current_query = query_text
-                        current_intent = item.get("intent")  # Store from metadata if present
-                        current_query_time = item.get("timestamp", 0.0)
-
-                elif item_type == "tool_output" and item.get("success") is True and current_query:
-                    # This is a successful tool run *related* to the last query.
-                    # Check if it's a final answer.
-                    result_str = item.get("tool_result", {}).get("result", "")
-                    if "FINAL_ANSWER:" in str(result_str):
-                        final_answer = str(result_str).split("FINAL_ANSWER:", 1)[-1].strip()
-
-                        # We have a full Q&A pair. Index it.
-                        full_text_to_embed = f"User: {current_query}\nAgent: {final_answer}"
-
-                        # Get embedding
-                        try:
-                            emb = get_embedding(full_text_to_embed)
-                        except Exception as embed_err:
-                            mcp_log(f"Embedding failed while indexing {json_path}: {embed_err}")
-                            return
-                        embeddings.append(emb)
-
-                        # Store the structured data as metadata
-                        metadata.append({
-                            "user_query": current_query,
-                            "final_answer": final_answer,
-                            "intent": current_intent,
-                            "source_file": str(json_path.relative_to(ROOT)),
-                            "timestamp": item.get("timestamp", 0.0)
-                        })
-
-                        # Clear current query to avoid duplicate answers for one query
-                        current_query = None
-
-        except Exception as e:
-            mcp_log(f"Failed to parse {json_path}: {e}")
-
-    if embeddings:
-        # Create and save the FAISS index
-        dim = embeddings[0].shape[0]
-        index = faiss.IndexFlatL2(dim)
-        index.add(np.stack(embeddings))
-        faiss.write_index(index, str(INDEX_FILE))
-
-        # Save the metadata
-        METADATA_FILE.write_text(json.dumps(metadata, indent=2))
+    with open(json_path, 'rb') as f:
+        items = orjson.loads(f.read()) if orjson is not None else json.load(f)
+
+    # Sort by timestamp to ensure correct Q&A order
+    items.sort(key=lambda x: x.get("timestamp", 0.0))
+
+    current_query = None
+    current_intent = None
+    current_query_time = 0.0
+
+    for item in items:
+        item_type = item.get("type")
+
+        if item_type == "run_metadata":
+            query_text = (item.get("metadata") or {}).get("user_query")
+            if query_text is None:
+                match = SESSION_START_RE.search(item.get("text", ""))
+                query_text = match.group(1) if match else None
+            if query_text is not None:
+                # This is a new user query. Store it.
+                current_query = query_text.strip()
+                current_intent = item.get("intent")  # Store from metadata if present
+                current_query_time = item.get("timestamp", 0.0)
+
+        elif item_type == "tool_output" and item.get("success") is True and current_query:
+            # This is a successful tool run *related* to the last query.
+            # Check if it's a final answer.
+            result_str = item.get("tool_result", {}).get("result", "")
+            if "FINAL_ANSWER:" in str(result_str):
+                final_answer = str(result_str).split("FINAL_ANSWER:", 1)[-1].strip()
+
+                # We have a full Q&A pair. Index it.
+                texts.append(f"User: {current_query}\nAgent: {final_answer}")
+
+                # Store the structured data as metadata
+                metadata.append({
+                    "user_query": current_query,
+                    "final_answer": final_answer,
+                    "intent": current_intent,
+                    "source_file": str(json_path.relative_to(ROOT)),
+                    "pair": len(metadata),  # ordinal of this Q&A pair within the file
+                    "timestamp": item.get("timestamp", 0.0)
+                })
+
+                # Clear current query to avoid duplicate answers for one query
+                current_query = None
+
+    return texts, metadata
+
+
+def _parse_session_safe(source_file: str):
+    """parse_session_file for a pool worker: returns (pairs, error) instead of raising."""
+    try:
+        return parse_session_file(ROOT / source_file), None
+    except Exception as e:
+        return ([], []), str(e)
+
+
+def collect_qa_pairs(source_files) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Parses the given session files (paths relative to ROOT), skipping unreadable ones."""
+    source_files = list(source_files)
+    if len(source_files) >= PARSE_POOL_MIN_FILES and PARSE_WORKERS > 1:
+        with ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=PARSE_MP_CONTEXT) as pool:
+            parsed = list(pool.map(_parse_session_safe, source_files, chunksize=64))
+    else:
+        parsed = map(_parse_session_safe, source_files)
+
+    texts = []
+    metadata = []
+    for source_file, ((file_texts, file_metadata), error) in zip(source_files, parsed):
+        if error is not None:
+            mcp_log(f"Failed to parse {source_file}: {error}")
+            continue
+        texts.extend(file_texts)
+        metadata.extend(file_metadata)
+    return texts, metadata
+
+
+def embed_texts(texts: List[str], metadata: List[Dict[str, Any]]) -> Optional[np.ndarray]:
+    """Embeds texts into one float32 matrix; returns None if any request fails."""
+    # Embed straight into one preallocated float32 matrix (no list + np.stack copy).
+    # Requests overlap so the rebuild pays a few round trips, not one per pair.
+    embeddings = np.empty((len(texts), EMBED_DIM), dtype=np.float32)
+    # Repeated texts (boilerplate answers, retried queries) are embedded once.
+    rows_by_text: Dict[str, List[int]] = {}
+    for row, text in enumerate(texts):
+        rows_by_text.setdefault(text, []).append(row)
+    with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as pool:
+        pending = {pool.submit(get_embedding, text): rows for text, rows in rows_by_text.items()}
+        for future, rows in pending.items():
+            try:
+                embeddings[rows] = future.result()
+            except Exception as embed_err:
+                mcp_log(f"Embedding failed while indexing {metadata[rows[0]]['source_file']}: {embed_err}")
+                for other in pending:
+                    other.cancel()
+                return None
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+
+def new_index(size: int) -> faiss.Index:
+    """Empty index suited to holding `size` vectors."""
+    qtype = faiss.ScalarQuantizer.QT_fp16
+    if size >= HNSW_MIN_VECTORS:
+        index = faiss.IndexHNSWSQ(EMBED_DIM, qtype, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return index
+    return faiss.IndexScalarQuantizer(EMBED_DIM, qtype, faiss.METRIC_INNER_PRODUCT)
+
+
+def save_index(index: faiss.Index, metadata: List[Dict[str, Any]], indexed_files: Dict[str, float]):
+    # Write beside and swap in: a search may still have the old file's codes mapped.
+    tmp_index = INDEX_FILE.with_suffix(".tmp")
+    faiss.write_index(index, str(tmp_index))
+    os.replace(tmp_index, INDEX_FILE)
+    compact = [{k: v for k, v in row.items() if k not in QA_TEXT_FIELDS} for row in metadata]
+    METADATA_FILE.write_text(json.dumps(compact, indent=2))
+    INDEX_STATE_FILE.write_text(json.dumps({
+        "metric": INDEX_METRIC,
+        "codec": INDEX_CODEC,
+        "metadata": METADATA_LAYOUT,
+        "files": indexed_files,
+    }, indent=2))
+
+
+def build_memory_index():
+    """
+    Builds a FAISS index from all conversation JSONs.
+    Combines GPT-5's structured parsing with Grok's semantic indexing.
+    """
+    if not ensure_embedding_service():
+        mcp_log("Skipping index rebuild until embedding service is available.")
+        return
+
+    mcp_log("Rebuilding historical conversation index...")
+    session_files = scan_session_files()
+    texts, metadata = collect_qa_pairs(sorted(session_files))
+
+    if texts:
+        embeddings = embed_texts(texts, metadata)
+        if embeddings is None:
+            return
+
+        # Create and save the FAISS index
+        index = new_index(len(texts))
+        index.add(embeddings)
+        save_index(index, metadata, session_files)
         mcp_log(f"Successfully indexed {len(metadata)} Q&A pairs.")
     else:
         mcp_log("No Q&A pairs found to index.")
 
 
+def update_memory_index(session_files: Dict[str, float], indexed_files: Dict[str, float]):
+    """
+    Brings the saved index up to date by embedding only new or modified session
+    files. Vectors of unchanged files are reused from the existing index.
+    """
+    if not ensure_embedding_service():
+        mcp_log("Skipping index update until embedding service is available.")
+        return
+
+    index = faiss.read_index(str(INDEX_FILE))
+    if index.d != EMBED_DIM:
+        mcp_log("Embedding dimension changed. Rebuilding...")
+        build_memory_index()
+        return
+    metadata = json.loads(METADATA_FILE.read_text())
+
+    # A modified file is re-parsed as a whole, so its old rows are dropped.
+    stale = {f for f, mtime in indexed_files.items() if session_files.get(f) != mtime}
+    changed = sorted(f for f, mtime in session_files.items() if indexed_files.get(f) != mtime)
+
+    texts, new_metadata = collect_qa_pairs(changed)
+    embeddings = embed_texts(texts, new_metadata)
+    if embeddings is None:
+        return
+
+    keep = [row for row, meta in enumerate(metadata) if meta["source_file"] not in stale]
+    size = len(keep) + len(texts)
+    same_kind = isinstance(index, faiss.IndexHNSW) == (size >= HNSW_MIN_VECTORS)
+    if len(keep) < len(metadata) or not same_kind:
+        # Rows have to go (or the index type changes): rebuild from the stored
+        # vectors, which costs a copy but no embedding calls.
+        # Only the kept rows are decoded, straight into one array.
+        kept_vectors = index.reconstruct_batch(np.array(keep, dtype=np.int64)) if keep else None
+        index = new_index(size)
+        if kept_vectors is not None:
+            index.add(kept_vectors)
+        metadata = [metadata[row] for row in keep]
+    if texts:
+        index.add(embeddings)
+    metadata.extend(new_metadata)
+
+    save_index(index, metadata, session_files)
+    mcp_log(f"Indexed {len(texts)} new Q&A pairs from {len(changed)} session files ({len(metadata)} total).")
+
+
 def ensure_index_ready():
-    """Checks if the index exists and is up-to-date, rebuilding if necessary."""
-    if not INDEX_FILE.exists() or not METADATA_FILE.exists():
+    """Checks if the index exists and is up-to-date, updating it if necessary."""
+    if not INDEX_FILE.exists() or not METADATA_FILE.exists() or not INDEX_STATE_FILE.exists():
         mcp_log("Index not found. Building for the first time...")
         build_memory_index()
         return
 
-    # Check if any memory files are newer than the index
-    index_mtime = INDEX_FILE.stat().st_mtime
-    latest_file_mtime = get_latest_file_mtime(MEMORY_DIR)
-
-    if latest_file_mtime > index_mtime:
-        mcp_log("Conversation history is newer than index. Rebuilding...")
+    state = json.loads(INDEX_STATE_FILE.read_text())
+    if (state.get("metric"), state.get("codec"), state.get("metadata")) != (INDEX_METRIC, INDEX_CODEC, METADATA_LAYOUT):
+        mcp_log("Index uses an older format. Rebuilding...")
         build_memory_index()
+        return
+
+    if _history_observer is not None and not HISTORY_CHANGED.is_set():
+        return  # nothing under MEMORY_DIR changed since the last scan
+    HISTORY_CHANGED.clear()
+
+    # Compare the session files on disk with the ones the index was built from
+    session_files = scan_session_files()
+    indexed_files = state["files"]
+
+    if session_files != indexed_files:
+        mcp_log("Conversation history changed since last index. Updating...")
+        update_memory_index(session_files, indexed_files)
+        if json.loads(INDEX_STATE_FILE.read_text())["files"] != session_files:
+            HISTORY_CHANGED.set()  # update failed; retry on the next search
     else:
         mcp_log("Index is up-to-date.")
 
 
+# Set by the watchdog observer whenever anything under MEMORY_DIR changes. Starts
+# set so the first check always scans.
+HISTORY_CHANGED = threading.Event()
+HISTORY_CHANGED.set()
+_history_observer = None
+
+
+def start_history_watcher() -> bool:
+    """
+    Watches MEMORY_DIR so ensure_index_ready can skip the per-file stat scan
+    while nothing changed. Without watchdog every check scans.
+    """
+    global _history_observer
+    if Observer is None:
+        return False
+
+    class _Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            HISTORY_CHANGED.set()
+
+    MEMORY_DIR.mkdir(exist_ok=True)
+    _history_observer = Observer()
+    _history_observer.daemon = True
+    _history_observer.schedule(_Handler(), str(MEMORY_DIR), recursive=True)
+    _history_observer.start()
+    return True
+
+
+# Search-side copy of the saved index, reloaded only when its files change. The
+# (index, metadata) pair is swapped as one tuple so lock-free readers never see
+# an index paired with another build's metadata.
+_index_cache: Dict[str, Any] = {"key": None, "snapshot": None}
+
+
+def load_search_index() -> Tuple[faiss.Index, List[Dict[str, Any]]]:
+    """Returns (index, metadata), rereading them from disk only after a rebuild."""
+    key = (INDEX_FILE.stat().st_mtime_ns, METADATA_FILE.stat().st_mtime_ns)
+    if _index_cache["key"] != key:
+        index = faiss.read_index(str(INDEX_FILE), INDEX_READ_FLAGS)
+        meta = orjson.loads(METADATA_FILE.read_bytes()) if orjson is not None else json.loads(METADATA_FILE.read_text())
+        _index_cache["snapshot"] = (index, meta)
+        _index_cache["key"] = key
+    return _index_cache["snapshot"]
+
+
+def load_qa_pair(row: Dict[str, Any], sessions: Dict[str, List[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """
+    Full metadata (with question and answer) for a compact index row, read from
+    its session file. None if the file is gone or no longer holds that pair.
+    """
+    source_file = row["source_file"]
+    if source_file not in sessions:
+        try:
+            sessions[source_file] = parse_session_file(ROOT / source_file)[1]
+        except Exception as e:
+            mcp_log(f"Failed to read {source_file} for a match: {e}")
+            sessions[source_file] = []
+    pairs = sessions[source_file]
+    if row["pair"] >= len(pairs) or pairs[row["pair"]]["timestamp"] != row["timestamp"]:
+        return None
+    return dict(pairs[row["pair"]])
+
+
+def current_search_index() -> Optional[Tuple[faiss.Index, List[Dict[str, Any]]]]:
+    """
+    (index, metadata) to search, brought up to date first. While another
+    search is already updating the index, the last loaded snapshot is served
+    instead of waiting. Returns None if there is no index yet.
+    """
+    snapshot = _index_cache["snapshot"]
+    if not INDEX_LOCK.acquire(blocking=snapshot is None):
+        return snapshot
+    try:
+        ensure_index_ready()  # Ensure index is ready before searching
+        if not INDEX_FILE.exists():
+            return None
+        return load_search_index()
+    finally:
+        INDEX_LOCK.release()
+
+
 # ========================= MCP TOOL =========================
 @mcp.tool()
-def search_historical_conversations(input: SearchInput) -> Dict[str, Any]:
+async def search_historical_conversations(input: SearchInput) -> Dict[str, Any]:
     """
     Semantically search all past conversations with the agent.
     Usage: input={"input": {"query": "what we discussed about Databricks", "max_results": 3}}
     result = await mcp.call_tool('search_historical_conversations', input)
     """
     try:
-        ensure_index_ready()  # Ensure index is ready before searching
+        # Embedding calls and index I/O block, so keep them off the event loop.
+        found = await asyncio.to_thread(_search_history, [input.query], input.max_results)
+    except Exception as e:
+        mcp_log(f"Error during search: {e}")
+        return {"result": {"status": "error", "message": str(e), "matches": []}}
 
-        if not INDEX_FILE.exists():
-            return {"result": {"matches": [], "message": "No history indexed."}}
+    if found is None:
+        return {"result": {"matches": [], "message": "No history indexed."}}
+    # Return matches in the standard "result" wrapper
+    return {"result": found[0]}
 
-        # Load index and metadata
-        index = faiss.read_index(str(INDEX_FILE))
-        meta = json.loads(METADATA_FILE.read_text())
 
-        # Get embedding for the user's query
-        q_vec = get_embedding(input.query).reshape(1, -1)
+@mcp.tool()
+async def search_historical_conversations_batch(input: BatchSearchInput) -> Dict[str, Any]:
+    """
+    Semantically search past conversations for several queries in one FAISS search.
+    Usage: input={"input": {"queries": ["Databricks pricing", "Databricks setup"], "max_results": 3}}
+    result = await mcp.call_tool('search_historical_conversations_batch', input)
+    """
+    try:
+        found = await asyncio.to_thread(_search_history, input.queries, input.max_results)
+    except Exception as e:
+        mcp_log(f"Error during batch search: {e}")
+        return {"result": {"status": "error", "message": str(e), "results": []}}
 
-        # Perform FAISS search
-        distances, indices = index.search(q_vec, input.max_results)
+    if found is None:
+        return {"result": {"results": [], "message": "No history indexed."}}
+    return {"result": {"results": found, "count": len(found)}}
 
+
+def _search_history(queries: List[str], max_results: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    Embeds the queries and answers all of them with one search over the stacked
+    query matrix. Returns one {query, matches, count} dict per query, or None if
+    there is no index yet.
+    """
+    # Load index and metadata
+    snapshot = current_search_index()
+    if snapshot is None:
+        return None
+    index, meta = snapshot
+
+    # Get embeddings for the queries, concurrently when there are several
+    q_mat = np.empty((len(queries), index.d), dtype=np.float32)
+    with ThreadPoolExecutor(max_workers=min(EMBED_WORKERS, len(queries))) as pool:
+        for row, vec in enumerate(pool.map(get_embedding, queries)):
+            q_mat[row] = vec
+    faiss.normalize_L2(q_mat)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = max(index.hnsw.efSearch, max_results * 8)
+
+    # Perform FAISS search
+    distances, indices = index.search(q_mat, max_results)
+
+    found = []
+    sessions: Dict[str, List[Dict[str, Any]]] = {}  # source_file -> parsed pairs, per search
+    for query, row_ids, row_dists in zip(queries, indices, distances):
         results = []
-        for i, dist in zip(indices[0], distances[0]):
+        for i, dist in zip(row_ids, row_dists):
             if 0 <= i < len(meta):
-                match = meta[i]
-                match["l2_distance"] = float(dist)  # Add distance score
+                match = load_qa_pair(meta[i], sessions)
+                if match is None:
+                    continue
+                match["cosine_similarity"] = float(dist)  # Add similarity score
                 results.append(match)
-
-        # Return matches in the standard "result" wrapper
-        return {
-            "result": {
-                "query": input.query,
-                "matches": results,
-                "count": len(results)
-            }
-        }
-    except Exception as e:
-        mcp_log(f"Error during search: {e}")
-        return {"result": {"status": "error", "message": str(e), "matches": []}}
+        found.append({"query": query, "matches": results, "count": len(results)})
+    return found
 
 
 # ========================= SERVER START =========================
 if __name__ == "__main__":
     mcp_log("Starting memory server...")
+    start_history_watcher()
     ensure_index_ready()  # Build index on first launch
     mcp.run(transport="stdio")
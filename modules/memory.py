@@ -6,6 +6,11 @@ import time
 from typing import List, Optional
 from pydantic import BaseModel
 
+try:
+    import orjson  # optional; serializes sessions several times faster than json
+except ImportError:
+    orjson = None
+
 # Optional fallback logger
 try:
     from agent import log
@@ -15,6 +20,13 @@ except ImportError:
         now = datetime.datetime.now().strftime("%H:%M:%S")
         print(f"[{now}] [{stage}] {msg}")
 
+def _dumps(obj) -> bytes:
+    """Indent-2 JSON as UTF-8 bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, indent=2).encode("utf-8")
+
+
 class MemoryItem(BaseModel):
     """Represents a single memory entry for a session."""
     timestamp: float
@@ -37,6 +49,9 @@ class MemoryManager:
         self.memory_dir = memory_dir
         self.memory_path = os.path.join('memory', session_id.split('-')[0], session_id.split('-')[1], session_id.split('-')[2], f'session-{session_id}.json')
         self.items: List[MemoryItem] = []
+        # Serialized form of each item (None until needed), so a full save only
+        # encodes items that are new or were edited since the last one.
+        self._dumped: List[Optional[bytes]] = []
 
         if not os.path.exists(self.memory_dir):
             os.makedirs(self.memory_dir)
@@ -45,22 +60,55 @@ class MemoryManager:
 
     def load(self):
         if os.path.exists(self.memory_path):
-            with open(self.memory_path, "r", encoding="utf-8") as f:
-                raw = json.load(f)
+            with open(self.memory_path, "rb") as f:
+                raw = orjson.loads(f.read()) if orjson is not None else json.load(f)
                 self.items = [MemoryItem(**item) for item in raw]
         else:
             self.items = []
+        self._dumped = [None] * len(self.items)
 
     def save(self):
         # Before opening the file for writing
         os.makedirs(os.path.dirname(self.memory_path), exist_ok=True)
-        with open(self.memory_path, "w", encoding="utf-8") as f:
-            raw = [item.dict() for item in self.items]
-            json.dump(raw, f, indent=2)
+        for i, dumped in enumerate(self._dumped):
+            if dumped is None:
+                self._dumped[i] = self._dump_item(self.items[i])
+        # Same bytes as _dumps([item.model_dump() for item in self.items]).
+        data = b"[\n" + b",\n".join(self._dumped) + b"\n]" if self._dumped else b"[]"
+        # Binary write keeps "\n" endings so _append can find the closing bracket on any OS.
+        with open(self.memory_path, "wb") as f:
+            f.write(data)
+
+    @staticmethod
+    def _dump_item(item: MemoryItem) -> bytes:
+        # Same text _dumps(raw) produces for one list element. Newlines inside
+        # JSON strings are escaped, so every raw newline is a layout break.
+        return b"  " + _dumps(item.model_dump()).replace(b"\n", b"\n  ")
+
+    def _append(self, dumped: bytes) -> bool:
+        """
+        Writes one new element into the saved JSON array in place, so adding
+        an item costs O(item) instead of rewriting the whole session.
+        Returns False when the file is missing or not in the expected layout.
+        """
+        try:
+            with open(self.memory_path, "r+b") as f:
+                if f.seek(0, os.SEEK_END) < 2:
+                    return False
+                f.seek(-2, os.SEEK_END)
+                if f.read(2) != b"\n]":
+                    return False
+                f.seek(-2, os.SEEK_END)
+                f.write(b",\n" + dumped + b"\n]")
+            return True
+        except FileNotFoundError:
+            return False
 
     def add(self, item: MemoryItem):
         self.items.append(item)
-        self.save()
+        self._dumped.append(self._dump_item(item))
+        if len(self.items) == 1 or not self._append(self._dumped[-1]):
+            self.save()
 
     def add_tool_call(
         self, tool_name: str, tool_args: dict, tags: Optional[List[str]] = None
@@ -117,9 +165,11 @@ class MemoryManager:
         """Patch last tool call or output for a given tool with success=True/False."""
 
         # Search backwards for latest matching tool call/output
-        for item in reversed(self.items):
+        for i in range(len(self.items) - 1, -1, -1):
+            item = self.items[i]
             if item.tool_name == tool_name and item.type in {"tool_call", "tool_output"}:
                 item.success = success
+                self._dumped[i] = None  # re-encode just this item on save
                 log("memory", f"✅ Marked {tool_name} as success={success}")
                 self.save()
                 return
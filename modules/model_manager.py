@@ -1,9 +1,11 @@
 import os
 import json
+import asyncio
+import functools
+from typing import AsyncIterator, Iterator
 import yaml
 import requests
 from pathlib import Path
-from google import genai
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,11 +13,12 @@ load_dotenv()
 ROOT = Path(__file__).parent.parent
 MODELS_JSON = ROOT / "config" / "models.json"
 PROFILE_YAML = ROOT / "config" / "profiles.yaml"
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 class ModelManager:
     def __init__(self):
         self.config = json.loads(MODELS_JSON.read_text())
-        self.profile = yaml.safe_load(PROFILE_YAML.read_text())
+        self.profile = yaml.load(PROFILE_YAML.read_text(), Loader=YAML_LOADER)
 
         self.text_model_key = self.profile["llm"]["text_generation"]
         self.model_info = self.config["models"][self.text_model_key]
@@ -23,17 +26,55 @@ class ModelManager:
 
         # ✅ Gemini initialization (your style)
         if self.model_type == "gemini":
+            from google import genai  # heavy; only needed for the Gemini backend
             api_key = os.getenv("GEMINI_API_KEY")
             self.client = genai.Client(api_key=api_key)
+        elif self.model_type == "ollama":
+            # One keep-alive session, so each generation reuses the connection.
+            self.session = requests.Session()
 
-    async def generate_text(self, prompt: str) -> str:
+    def _generator(self):
         if self.model_type == "gemini":
-            return self._gemini_generate(prompt)
+            return self._gemini_generate
+        if self.model_type == "ollama":
+            return self._ollama_generate
+        raise NotImplementedError(f"Unsupported model type: {self.model_type}")
+
+    async def generate_text(self, prompt: str) -> str:
+        # Both backends block; run them off the event loop. Nothing here relies on
+        # contextvars, so hand the bound method straight to the executor instead
+        # of asyncio.to_thread's partial + copy_context wrapping.
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._generator(), prompt)
 
+    def generate_text_sync(self, prompt: str) -> str:
+        """Blocking generate_text for callers that have no event loop."""
+        return self._generator()(prompt)
+
+    async def stream_text(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Yields the reply in chunks as the backend produces them. Closing the
+        iterator early closes the underlying request, which stops generation.
+        """
+        if self.model_type == "gemini":
+            chunks = self._gemini_stream(prompt)
         elif self.model_type == "ollama":
-            return self._ollama_generate(prompt)
+            chunks = self._ollama_stream(prompt)
+        else:
+            raise NotImplementedError(f"Unsupported model type: {self.model_type}")
 
-        raise NotImplementedError(f"Unsupported model type: {self.model_type}")
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            try:
+                chunks.close()
+            except ValueError:
+                pass  # cancelled mid-read; the worker thread still owns the generator
 
     def _gemini_generate(self, prompt: str) -> str:
         response = self.client.models.generate_content(
@@ -50,10 +91,40 @@ class ModelManager:
             except Exception:
                 return str(response)
 
+    def _gemini_stream(self, prompt: str) -> Iterator[str]:
+        for chunk in self.client.models.generate_content_stream(
+            model=self.model_info["model"],
+            contents=prompt
+        ):
+            if chunk.text:
+                yield chunk.text
+
     def _ollama_generate(self, prompt: str) -> str:
-        response = requests.post(
+        response = self.session.post(
             self.model_info["url"]["generate"],
             json={"model": self.model_info["model"], "prompt": prompt, "stream": False}
         )
         response.raise_for_status()
         return response.json()["response"].strip()
+
+    def _ollama_stream(self, prompt: str) -> Iterator[str]:
+        with self.session.post(
+            self.model_info["url"]["generate"],
+            json={"model": self.model_info["model"], "prompt": prompt, "stream": True},
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                part = json.loads(line)
+                if part.get("response"):
+                    yield part["response"]
+                if part.get("done"):
+                    break
+
+
+@functools.lru_cache(maxsize=1)
+def get_model_manager() -> ModelManager:
+    """Shared ModelManager, built on first use instead of at import time."""
+    return ModelManager()
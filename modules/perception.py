@@ -1,12 +1,22 @@
 # modules/perception.py
 
-from typing import List, Optional
-from pydantic import BaseModel
-from modules.model_manager import ModelManager
-from modules.tools import load_prompt, extract_json_block
-from core.context import AgentContext
+from typing import Dict, List, Optional
+from pydantic import BaseModel, ConfigDict
+from modules.model_manager import get_model_manager
+from modules.tools import load_prompt, render_prompt, extract_json_block
+from core.context import AgentContext, format_server_descriptions
 
-import json
+import asyncio
+from collections import OrderedDict
+from contextlib import aclosing
+try:
+    import orjson as _json  # faster parsing of LLM replies when available
+except ImportError:
+    import json as _json
+try:
+    import json_repair  # fixes trailing commas, unterminated strings, etc.
+except ImportError:
+    json_repair = None
 
 
 # Optional logging fallback
@@ -18,74 +28,252 @@ except ImportError:
         now = datetime.datetime.now().strftime("%H:%M:%S")
         print(f"[{now}] [{stage}] {msg}")
 
-model = ModelManager()
-
-
 prompt_path = "prompts/perception_prompt.txt"
+PERCEPTION_CONCURRENCY = 4  # in-flight LLM calls for run_perception_batch
+PERCEPTION_CACHE_SIZE = 512
+# (user_input, sorted server ids) → PerceptionResult, least recently used first.
+_perception_cache: "OrderedDict[tuple, PerceptionResult]" = OrderedDict()
+# Same key → the running perception task, so concurrent repeats share one LLM call.
+_inflight: Dict[tuple, "asyncio.Task[PerceptionResult]"] = {}
 
 class PerceptionResult(BaseModel):
+    # Results are cached and shared between callers, so they are read-only.
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     intent: str
     entities: List[str] = []
     tool_hint: Optional[str] = None
     tags: List[str] = []
     selected_servers: List[str] = []  # 🆕 NEW field
 
-async def extract_perception(user_input: str, mcp_server_descriptions: dict) -> PerceptionResult:
+class _JsonObjectScanner:
     """
-    Extracts perception details and selects relevant MCP servers based on the user query.
+    Tracks a streamed reply and finds where its first top-level JSON object
+    ends. Text before the opening brace (fences, a "json" tag) is skipped.
     """
 
-    server_list = []
-    for server_id, server_info in mcp_server_descriptions.items():
-        description = server_info.get("description", "No description available")
-        server_list.append(f"- {server_id}: {description}")
+    def __init__(self):
+        self.text = ""
+        self.start = -1
+        self.end = -1
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
 
-    servers_text = "\n".join(server_list)
+    def feed(self, chunk: str) -> bool:
+        """Adds a chunk; True once the object has closed."""
+        offset = len(self.text)
+        self.text += chunk
+        for i, ch in enumerate(chunk, offset):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = self.start != -1
+            elif ch == "{":
+                if self.start == -1:
+                    self.start = i
+                self._depth += 1
+            elif ch == "}" and self.start != -1:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.end = i + 1
+                    return True
+        return False
 
-    prompt_template = load_prompt(prompt_path)
-    
 
-    prompt = prompt_template.format(
-        servers_text=servers_text,
-        user_input=user_input
+def _parse_reply(json_block: str, mcp_server_descriptions: dict) -> PerceptionResult:
+    try:
+        result = _json.loads(json_block)
+    except _json.JSONDecodeError:
+        if json_repair is None:
+            raise
+        # Repairing locally is far cheaper than the full-step retry a failure causes.
+        log("perception", "⚠️ Malformed JSON, attempting repair.")
+        result = _json.loads(json_repair.repair_json(json_block))
+
+    # If selected_servers missing, fallback
+    if "selected_servers" not in result:
+        result["selected_servers"] = list(mcp_server_descriptions.keys())
+    print("result", result)
+
+    return PerceptionResult.model_validate(result)
+
+
+class _PerceptionFallback(PerceptionResult):
+    """Stand-in result when the model call or its reply fails; never cached."""
+
+
+def _fallback_result(mcp_server_descriptions: dict) -> PerceptionResult:
+    # Fallback: select all servers
+    return _PerceptionFallback(
+        intent="unknown",
+        entities=[],
+        tool_hint=None,
+        tags=[],
+        selected_servers=list(mcp_server_descriptions.keys())
     )
-    
 
+
+async def _perceive(prompt: str, mcp_server_descriptions: dict) -> PerceptionResult:
+    """Runs one perception prompt through the LLM and parses the reply."""
     try:
-        raw = await model.generate_text(prompt)
-        raw = raw.strip()
+        # Stop reading as soon as the JSON object closes instead of waiting
+        # for whatever the model appends after it.
+        scanner = _JsonObjectScanner()
+        async with aclosing(get_model_manager().stream_text(prompt)) as chunks:
+            async for chunk in chunks:
+                if scanner.feed(chunk):
+                    break
+        raw = scanner.text.strip()
         log("perception", f"Raw output: {raw}")
 
         # Try parsing into PerceptionResult
-        json_block = extract_json_block(raw)
-        result = json.loads(json_block)
+        if scanner.end != -1:
+            json_block = scanner.text[scanner.start:scanner.end]
+        else:
+            json_block = extract_json_block(raw)
+        return _parse_reply(json_block, mcp_server_descriptions)
+
+    except Exception as e:
+        log("perception", f"⚠️ Perception failed: {e}")
+        return _fallback_result(mcp_server_descriptions)
+
+
+def _perception_prompt(
+    user_input: str, mcp_server_descriptions: dict, servers_text: Optional[str] = None
+) -> str:
+    if servers_text is None:
+        servers_text = format_server_descriptions(mcp_server_descriptions)
+    return render_prompt(
+        load_prompt(prompt_path),
+        servers_text=servers_text,
+        user_input=user_input
+    )
+
 
-        # If selected_servers missing, fallback
-        if "selected_servers" not in result:
-            result["selected_servers"] = list(mcp_server_descriptions.keys())
-        print("result", result)
+async def extract_perception(
+    user_input: str, mcp_server_descriptions: dict, servers_text: Optional[str] = None
+) -> PerceptionResult:
+    """
+    Extracts perception details and selects relevant MCP servers based on the user query.
+    Pass servers_text when the formatted server list is already at hand.
+    """
+    prompt = _perception_prompt(user_input, mcp_server_descriptions, servers_text)
+    return await _perceive(prompt, mcp_server_descriptions)
+
+
+async def extract_perception_batch(
+    user_inputs: List[str], mcp_server_descriptions: dict, servers_text: Optional[str] = None
+) -> List[PerceptionResult]:
+    """
+    Perception for several inputs, in input order. The template and server list
+    are formatted once and the LLM calls overlap, at most
+    PERCEPTION_CONCURRENCY at a time. Ollama itself runs up to
+    OLLAMA_NUM_PARALLEL requests per model concurrently; raise both together.
+    """
+    prompt_template = load_prompt(prompt_path)
+    if servers_text is None:
+        servers_text = format_server_descriptions(mcp_server_descriptions)
+    limit = asyncio.Semaphore(PERCEPTION_CONCURRENCY)
+
+    async def perceive(user_input: str) -> PerceptionResult:
+        prompt = render_prompt(prompt_template, servers_text=servers_text, user_input=user_input)
+        async with limit:
+            return await _perceive(prompt, mcp_server_descriptions)
+
+    return list(await asyncio.gather(*(perceive(user_input) for user_input in user_inputs)))
+
+
+async def run_perception(context: AgentContext, user_input: Optional[str] = None, cache: bool = True):
+
+    """
+    Clean wrapper to call perception from context.
+    Repeated inputs against the same servers are answered from an LRU cache,
+    and identical calls already in flight are joined rather than repeated;
+    pass cache=False to always ask the model. With no MCP servers configured
+    there is nothing to select, so the model is not asked at all and the
+    result has intent "unknown"; LLM-derived intent needs at least one server.
+    """
+    user_input = user_input or context.user_input
+    if not context.mcp_server_descriptions:
+        return _fallback_result(context.mcp_server_descriptions)
+    if not cache:
+        return await extract_perception(
+            user_input=user_input,
+            mcp_server_descriptions=context.mcp_server_descriptions,
+            servers_text=context.server_descriptions_text,
+        )
+
+    key = (user_input, tuple(sorted(context.mcp_server_descriptions)))
+    if key in _perception_cache:
+        _perception_cache.move_to_end(key)
+        return _perception_cache[key]
 
-        return PerceptionResult(**result)
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(extract_perception(
+            user_input=user_input,
+            mcp_server_descriptions=context.mcp_server_descriptions,
+            servers_text=context.server_descriptions_text,
+        ))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # Shielded: one caller being cancelled must not cancel the others' call.
+    result = await asyncio.shield(task)
+    _remember(key, result)
+    return result
+
+
+def run_perception_sync(
+    context: AgentContext, user_input: Optional[str] = None, cache: bool = True
+) -> PerceptionResult:
+    """
+    Blocking run_perception for scripts and one-shot CLI calls: the model is
+    called directly, with no event loop to start. The agent loop and batches
+    keep using the async versions.
+    """
+    user_input = user_input or context.user_input
+    if not context.mcp_server_descriptions:
+        return _fallback_result(context.mcp_server_descriptions)
+    key = (user_input, tuple(sorted(context.mcp_server_descriptions)))
+    if cache and key in _perception_cache:
+        _perception_cache.move_to_end(key)
+        return _perception_cache[key]
 
+    prompt = _perception_prompt(user_input, context.mcp_server_descriptions, context.server_descriptions_text)
+    try:
+        raw = get_model_manager().generate_text_sync(prompt).strip()
+        log("perception", f"Raw output: {raw}")
+        result = _parse_reply(extract_json_block(raw), context.mcp_server_descriptions)
     except Exception as e:
         log("perception", f"⚠️ Perception failed: {e}")
-        # Fallback: select all servers
-        return PerceptionResult(
-            intent="unknown",
-            entities=[],
-            tool_hint=None,
-            tags=[],
-            selected_servers=list(mcp_server_descriptions.keys())
-        )
+        result = _fallback_result(context.mcp_server_descriptions)
+    if cache:
+        _remember(key, result)
+    return result
 
 
-async def run_perception(context: AgentContext, user_input: Optional[str] = None):
+def _remember(key: tuple, result: PerceptionResult):
+    # The failure fallback is not stored, so a transient LLM error gets retried.
+    # A genuine reply whose intent happens to be "unknown" is still cached.
+    if isinstance(result, _PerceptionFallback):
+        return
+    _perception_cache[key] = result
+    while len(_perception_cache) > PERCEPTION_CACHE_SIZE:
+        _perception_cache.popitem(last=False)
 
+
+async def run_perception_batch(context: AgentContext, user_inputs: List[str]) -> List[PerceptionResult]:
     """
-    Clean wrapper to call perception from context.
+    Batched run_perception: one PerceptionResult per input, in order.
     """
-    return await extract_perception(
-        user_input = user_input or context.user_input,
-        mcp_server_descriptions=context.mcp_server_descriptions
+    return await extract_perception_batch(
+        user_inputs=user_inputs,
+        mcp_server_descriptions=context.mcp_server_descriptions,
+        servers_text=context.server_descriptions_text,
     )
-
@@ -0,0 +1,193 @@
+# modules/response_cache.py
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+import faiss
+import numpy as np
+import requests
+
+# Optional fallback logger
+try:
+    from agent import log
+except ImportError:
+    import datetime
+    def log(stage: str, msg: str):
+        now = datetime.datetime.now().strftime("%H:%M:%S")
+        print(f"[{now}] [{stage}] {msg}")
+
+# Same embedding backend the memory server uses for historical search.
+EMBED_URL = "http://localhost:11434/api/embeddings"
+EMBED_MODEL = "nomic-embed-text"
+
+EXACT_CACHE_FILE = Path(".cortex/cache/llm_responses.json")
+# Answers can go stale (news, prices, "today"), so both tiers expire entries.
+RESPONSE_TTL_SECONDS = 3600.0
+# Embeddings barely separate "factorial of 3" from "factorial of 5", so a
+# semantic hit also needs the same numbers, in the same order.
+NUMBER_RE = re.compile(r"\d+(?:[.,/]\d+)*")
+# After a failed embedding request, wait this long before trying again
+# (doubling per consecutive failure, up to the max).
+EMBED_RETRY_SECONDS = 5.0
+EMBED_RETRY_MAX_SECONDS = 300.0
+
+
+def _request_embedding(text: str, timeout: float = 15.0) -> np.ndarray:
+    resp = requests.post(EMBED_URL, json={"model": EMBED_MODEL, "prompt": text}, timeout=timeout)
+    resp.raise_for_status()
+    vector = resp.json().get("embedding")
+    if vector is None:
+        raise ValueError("Embedding service returned no vector.")
+    return np.array(vector, dtype=np.float32)
+
+
+class ExactResponseCache:
+    """
+    SHA-256(query) → final answer. Checked before the semantic cache so that
+    identical queries skip the embedding call entirely. Persisted as JSON so
+    it survives restarts; entries expire after ttl_seconds, and expired or
+    undated ones are dropped on load.
+    """
+
+    def __init__(
+        self,
+        path: Path = EXACT_CACHE_FILE,
+        max_entries: int = 1024,
+        ttl_seconds: float = RESPONSE_TTL_SECONDS,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[str, tuple[str, float]]" = OrderedDict()  # key → (answer, created_at)
+        if self.path.exists():
+            try:
+                stored = json.loads(self.path.read_text(encoding="utf-8"))
+            except Exception as e:
+                log("cache", f"Ignoring unreadable exact cache {self.path}: {e}")
+                stored = {}
+            now = time.time()
+            for key, entry in stored.items():
+                # Files written before entries were dated hold bare answers; drop those.
+                if isinstance(entry, list) and len(entry) == 2 and now - entry[1] <= self.ttl_seconds:
+                    self.entries[key] = (entry[0], entry[1])
+
+    @staticmethod
+    def _key(query: str) -> str:
+        return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+    def get(self, query: str) -> Optional[str]:
+        key = self._key(query)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        answer, created_at = entry
+        if time.time() - created_at > self.ttl_seconds:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        log("cache", "Exact cache hit.")
+        return answer
+
+    def put(self, query: str, answer: str):
+        key = self._key(query)
+        self.entries[key] = (answer, time.time())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(self.entries, indent=2), encoding="utf-8")
+
+
+class SemanticResponseCache:
+    """
+    In-memory cache of final answers keyed by query embedding.
+    A lookup hits when a stored query has cosine similarity >= threshold and
+    contains the same numbers as the new one.
+    Entries expire after ttl_seconds and the least recently used entry is
+    evicted once max_entries is reached. While the embedding backend is down
+    the cache is bypassed, and it is retried with exponential backoff.
+    """
+
+    def __init__(self, threshold: float = 0.98, max_entries: int = 256, ttl_seconds: float = RESPONSE_TTL_SECONDS):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.index: Optional[faiss.IndexIDMap2] = None
+        # id → (query, answer, created_at)
+        self.entries: "OrderedDict[int, tuple[str, str, float]]" = OrderedDict()
+        self.next_id = 0
+        self.retry_at = 0.0
+        self.retry_delay = EMBED_RETRY_SECONDS
+
+    async def _embed(self, text: str) -> Optional[np.ndarray]:
+        if time.monotonic() < self.retry_at:
+            return None
+        try:
+            vec = await asyncio.to_thread(_request_embedding, text)
+        except Exception as e:
+            log("cache", f"Embedding unavailable, skipping response cache for {self.retry_delay:.0f}s: {e}")
+            self.retry_at = time.monotonic() + self.retry_delay
+            self.retry_delay = min(self.retry_delay * 2, EMBED_RETRY_MAX_SECONDS)
+            return None
+        self.retry_delay = EMBED_RETRY_SECONDS
+        vec = vec.reshape(1, -1)
+        faiss.normalize_L2(vec)
+        return vec
+
+    async def prewarm(self):
+        """Issue one throwaway embedding so the backend has the model loaded."""
+        await self._embed("__response_cache_warmup__")
+
+    def _remove(self, entry_id: int):
+        self.entries.pop(entry_id, None)
+        self.index.remove_ids(np.array([entry_id], dtype=np.int64))
+
+    async def lookup(self, query: str) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Returns (answer or None, query embedding). Pass the embedding on to
+        put() so a miss isn't embedded twice.
+        """
+        vec = await self._embed(query)
+        if vec is None or not self.entries:
+            return None, vec
+
+        sims, ids = self.index.search(vec, 1)
+        entry_id, sim = int(ids[0][0]), float(sims[0][0])
+        if entry_id not in self.entries or sim < self.threshold:
+            return None, vec
+
+        cached_query, answer, created_at = self.entries[entry_id]
+        if time.time() - created_at > self.ttl_seconds:
+            self._remove(entry_id)
+            return None, vec
+        if NUMBER_RE.findall(cached_query) != NUMBER_RE.findall(query):
+            return None, vec
+
+        self.entries.move_to_end(entry_id)
+        log("cache", f"Semantic cache hit (similarity={sim:.3f}).")
+        return answer, vec
+
+    async def put(self, query: str, answer: str, vec: Optional[np.ndarray] = None):
+        if vec is None:
+            vec = await self._embed(query)
+        if vec is None:
+            return
+        if self.index is None:
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(vec.shape[1]))
+
+        while len(self.entries) >= self.max_entries:
+            oldest_id = next(iter(self.entries))
+            self._remove(oldest_id)
+
+        entry_id = self.next_id
+        self.next_id += 1
+        self.index.add_with_ids(vec, np.array([entry_id], dtype=np.int64))
+        self.entries[entry_id] = (query, answer, time.time())
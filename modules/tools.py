@@ -1,10 +1,47 @@
 # modules/tools.py
 
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
+from bisect import bisect_right
+from collections import OrderedDict
+import functools
+import os
 import re
+import string
+from pathlib import Path
+
+# Tool lists are fixed once MultiMCP has scanned its servers, so summaries and
+# hint filters are memoized by tool names. MultiMCP.initialize clears them.
+# Hints are free-form LLM text, so both caches are LRU-bounded.
+TOOL_CACHE_SIZE = 256
+_summary_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_filter_cache: "OrderedDict[tuple, Tuple[Any, ...]]" = OrderedDict()
+
+
+def clear_tool_caches():
+    _summary_cache.clear()
+    _filter_cache.clear()
+
+
+def _cache_get(cache: OrderedDict, key: tuple):
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+
+def _cache_put(cache: OrderedDict, key: tuple, value):
+    cache[key] = value
+    while len(cache) > TOOL_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+# A fenced block, with or without a "json" tag or a newline after the opening fence.
+JSON_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+
 
 def extract_json_block(text: str) -> str:
-    match = re.search(r"```json\n(.*?)```", text, re.DOTALL)
+    # Bare JSON replies are common; skip the regex when there is no fence at all.
+    match = JSON_FENCE_RE.search(text) if "```" in text else None
     if match:
         return match.group(1).strip()
     return text.strip()
@@ -15,10 +52,15 @@ def summarize_tools(tools: List[Any]) -> str:
     Generate a string summary of tools for LLM prompt injection.
     Format: "- tool_name: description"
     """
-    return "\n".join(
-        f"- {tool.name}: {getattr(tool, 'description', 'No description provided.')}"
-        for tool in tools
-    )
+    key = tuple(tool.name for tool in tools)
+    summary = _cache_get(_summary_cache, key)
+    if summary is None:
+        summary = "\n".join(
+            f"- {tool.name}: {getattr(tool, 'description', 'No description provided.')}"
+            for tool in tools
+        ) or "No tools available."
+        _cache_put(_summary_cache, key, summary)
+    return summary
 
 
 def filter_tools_by_hint(tools: List[Any], hint: Optional[str] = None) -> List[Any]:
@@ -29,9 +71,37 @@ def filter_tools_by_hint(tools: List[Any], hint: Optional[str] = None) -> List[A
     if not hint:
         return tools
 
+    key = (hint, tuple(tool.name for tool in tools))
+    cached = _cache_get(_filter_cache, key)
+    if cached is not None:
+        return list(cached)  # a fresh list, so callers can't alter the cached result
+
     hint_lower = hint.lower()
-    filtered = [tool for tool in tools if hint_lower in tool.name.lower()]
-    return filtered if filtered else tools
+    filtered = []
+    if "\n" not in hint_lower:  # names never contain one, so nothing could match
+        # One scan of all names for the hint; after each hit, skip to the next name.
+        haystack, starts = _lowered_names(key[1])
+        pos = haystack.find(hint_lower)
+        while pos != -1:
+            i = bisect_right(starts, pos) - 1
+            filtered.append(tools[i])
+            if i + 1 == len(starts):
+                break
+            pos = haystack.find(hint_lower, starts[i + 1])
+    result = filtered if filtered else list(tools)
+    _cache_put(_filter_cache, key, tuple(result))
+    return result
+
+
+@functools.lru_cache(maxsize=8)
+def _lowered_names(names: tuple) -> Tuple[str, List[int]]:
+    """Tool names lowercased and newline-joined, plus the offset where each starts."""
+    starts = []
+    offset = 0
+    for name in names:
+        starts.append(offset)
+        offset += len(name.lower()) + 1
+    return "\n".join(name.lower() for name in names), starts
 
 
 def get_tool_map(tools: List[Any]) -> Dict[str, Any]:
@@ -48,6 +118,51 @@ def tool_expects_input(self, tool_name: str) -> bool:
     return list(tool.parameters.keys()) == ['input']
 
 
+@functools.lru_cache(maxsize=32)
+def _read_prompt(path: str, mtime_ns: int) -> str:
+    # One binary read and decode. Most prompt files are CRLF, so newlines are
+    # translated the way text mode would.
+    text = Path(path).read_bytes().decode("utf-8")
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
 def load_prompt(path: str) -> str:
-    with open(path, "r", encoding="utf-8") as f:
-        return f.read()
+    """
+    Prompt template text. Each file is read once and then served from cache
+    until its mtime changes, so edits during a run are still picked up.
+    """
+    return _read_prompt(path, os.stat(path).st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=32)
+def _template_parts(template: str) -> Optional[tuple]:
+    """
+    Template split into literal text (even indexes, braces already unescaped)
+    and field names (odd indexes). None if any field needs more than a plain
+    name lookup, e.g. a format spec, conversion or attribute access, or if
+    the template is malformed (str.format then raises its usual error).
+    """
+    parts = [""]
+    try:
+        # Escaped braces end a literal chunk without a field; join those up.
+        for literal, field, spec, conversion in string.Formatter().parse(template):
+            parts[-1] += literal
+            if field is None:
+                continue
+            if spec or conversion or not field.isidentifier():
+                return None
+            parts += [field, ""]
+    except ValueError:
+        return None
+    return tuple(parts)
+
+
+def render_prompt(template: str, **values: Any) -> str:
+    """
+    Same result as template.format(**values), but the template is parsed once
+    and each render is a single join.
+    """
+    parts = _template_parts(template)
+    if parts is None:
+        return template.format(**values)
+    return "".join(str(values[part]) if i % 2 else part for i, part in enumerate(parts))